@@ -1,18 +1,8 @@
 from django.contrib import admin
 
-from apps.game.models import Capture, Game, Move
+from apps.game.models import Game
 
 
 @admin.register(Game)
 class GameAdmin(admin.ModelAdmin):
-    pass
-
-
-@admin.register(Move)
-class MoveAdmin(admin.ModelAdmin):
-    pass
-
-
-@admin.register(Capture)
-class CaptureAdmin(admin.ModelAdmin):
-    pass
+    list_display = ("game_id", "moves_count", "captures_count", "winner")
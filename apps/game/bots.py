@@ -0,0 +1,143 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+from chess import transposition
+from chess.book import book_move
+from chess.search import Searcher, SearchResult
+from chess.tablebase import tablebase_move
+
+
+def init_worker(table_megabytes):
+    """
+    Sizes the transposition table of a worker process like the parent's
+    """
+    transposition._table = transposition.TranspositionTable(table_megabytes)
+
+
+def find_move(board, time_ms):
+    """
+    Runs in a worker process, returns a `chess.search.SearchResult`
+    """
+    return Searcher(board, time_ms=time_ms).search()
+
+
+class BotBusy(Exception):
+    """
+    Raised when too many bot moves are already waiting for a worker
+    """
+
+
+class BotPool:
+    """
+    Computes the computer's moves in worker processes
+    ---
+
+    Searches are CPU bound, so they run in a `ProcessPoolExecutor` and the
+    websocket consumers only await the result.
+
+    `workers: int`: Number of worker processes
+
+    `max_queue: int`: Most requests waiting or running before `BotBusy`
+
+    `timeout_ms: int`: Time a request may take, queueing included, on top
+    of its own search time
+
+    Methods
+    ---
+    `request(board, time_ms)`: Awaits the best move for `board`, straight
+    from the opening book or the endgame tablebases when they cover it
+
+    `metrics()`: Queue depth and request counters
+    """
+
+    def __init__(self, workers, max_queue, timeout_ms) -> None:
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout_ms = timeout_ms
+        self.executor = None
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.counters = {
+            "book": 0,
+            "tablebase": 0,
+            "submitted": 0,
+            "completed": 0,
+            "timed_out": 0,
+            "failed": 0,
+        }
+
+    def get_executor(self) -> ProcessPoolExecutor:
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=init_worker,
+                    initargs=(settings.CHESS_TT_MB,),
+                )
+            return self.executor
+
+    async def request(self, board, time_ms):
+        """
+        Searches a copy of `board` for `time_ms` in a worker process.
+        Raises `BotBusy` when the queue is full and `asyncio.TimeoutError`
+        when no result came back in time.
+        """
+        # Book and tablebase lookups are a few reads of a mapped file, no
+        # worker needed
+        move = book_move(board)
+        if move is not None:
+            self.count("book")
+            return SearchResult(move, 0, 0, 0, 0)
+        move = tablebase_move(board)
+        if move is not None:
+            self.count("tablebase")
+            return SearchResult(move, 0, 0, 0, 0)
+
+        with self.lock:
+            if self.pending >= self.max_queue:
+                raise BotBusy
+            self.pending += 1
+            self.counters["submitted"] += 1
+
+        try:
+            future = self.get_executor().submit(find_move, board.copy(), time_ms)
+            timeout = (time_ms + self.timeout_ms) / 1000
+            result = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            self.count("timed_out")
+            raise
+        except Exception:
+            self.count("failed")
+            raise
+        else:
+            self.count("completed")
+            return result
+        finally:
+            with self.lock:
+                self.pending -= 1
+
+    def count(self, name) -> None:
+        with self.lock:
+            self.counters[name] += 1
+
+    def metrics(self):
+        with self.lock:
+            return {"workers": self.workers, "pending": self.pending, **self.counters}
+
+    def shutdown(self) -> None:
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = None
+
+
+bot_pool = BotPool(
+    workers=settings.CHESS_BOT_WORKERS,
+    max_queue=settings.CHESS_BOT_MAX_QUEUE,
+    timeout_ms=settings.CHESS_BOT_TIMEOUT_MS,
+)
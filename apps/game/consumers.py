@@ -1,21 +1,93 @@
+import asyncio
 import json
-from channels.generic.websocket import WebsocketConsumer
-from chess.constants import FILES_TO_COLUMNS, ROW_NAMES
-from chess.engine import ChessEngine
-from apps.game.models import Capture, Game, Move
-from asgiref.sync import async_to_sync
+import uuid
+from urllib.parse import parse_qs
 
-from django.shortcuts import get_object_or_404
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from channels.generic.http import AsyncHttpConsumer
+from channels.generic.websocket import AsyncWebsocketConsumer
+from django import db
+from django.conf import settings
 
-from chess.pieces import ChessPiece
+from apps.game.bots import BotBusy, bot_pool
+from apps.game.persistence import move_writer
+from apps.game.pgn import export_games
+from apps.game.protocol import SUBPROTOCOL, pack_move, pack_snapshot, read_move
+from apps.game.registry import piece_name, registry
+from apps.game.replay import stored_moves
+from chess.constants import (
+    BLACK,
+    BLACK_PIECE,
+    FILES_TO_COLUMNS,
+    PIECE_CODES,
+    QUEEN_CODE,
+    RANKS_TO_ROWS,
+    SQUARE_NAMES,
+    SQUARES,
+    WHITE,
+)
+from chess.moves import decode_move
 
-class MovesConsumer(WebsocketConsumer):
+# Pieces a pawn can promote to, by their letter in a move message
+PROMOTION_LETTERS = ("N", "B", "R", "Q")
+
+
+def run_engine(function, *args, **kwargs):
+    """
+    Runs an engine call in a worker thread, keeping the event loop free
+    """
+    return sync_to_async(function, thread_sensitive=False)(*args, **kwargs)
+
+
+def move_json(event):
+    """
+    The JSON a client gets for a move event
+    """
+    start, end, promotion = decode_move(event["move"])
+    if promotion:
+        # The side that moved is the one not to play now
+        promotion = piece_name(
+            promotion | (BLACK_PIECE if event["white_to_play"] else 0)
+        )
+    return {
+        "type": "move",
+        "seq": event["seq"],
+        "from": SQUARE_NAMES[start],
+        "to": SQUARE_NAMES[end],
+        "promotion": promotion or None,
+        "captured": piece_name(event["captured"]),
+        "side_to_move": WHITE if event["white_to_play"] else BLACK,
+        "check": event["check"],
+        "message": event["message"],
+    }
+
+
+def pack_event(event):
+    return pack_move(
+        event["seq"],
+        event["move"],
+        event["captured"],
+        event["white_to_play"],
+        event["check"],
+    )
+
+
+def game_over_json(result):
+    """
+    The JSON a client gets when the game ended, see `chess.engine.Outcome`
+    """
+    return {"type": "game_over", "winner": result.winner, "reason": result.reason}
+
+
+class MovesConsumer(AsyncWebsocketConsumer):
     """
     Initializes a websocket connection to play the game
 
-    Constructor
-    ---
-    Takes a `game: ChessBoard`
+    Connect to `ws/play/<game_id>/` to join a game, or to `ws/play/` to start
+    a new one. Players of a game share one `ChessEngine` from
+    `apps.game.registry` and one channel group, so a move is only sent to
+    the players of its game.
 
     Methods
     ---
@@ -24,145 +96,322 @@ class MovesConsumer(WebsocketConsumer):
     ```json
         {
             "message": {
-                "start": [0, 2],
-                "end": [0, 4]
+                "from": ["e", "2"],
+                "to": ["e", "4"]
             }
         }
     ```
-    and shows a flow of the messages from the game engine
+    and broadcasts the move to the game as
+    `{"type": "move", "seq": 1, "from": "e2", "to": "e4", "promotion": null,
+    "captured": null, "side_to_move": "b", "check": false, "message": "wP
+    moved."}`. Castling is sent as the king's move and a promotion names the
+    new piece, `"promotion": "wQ"`. A pawn promotes to a queen unless the
+    move asks for `"promotion": "N"` (or `B`, `R`), any other letter is an
+    error. An illegal move only gets an `error` back. The move that ends
+    the game is followed by `{"type": "game_over", "winner": "White",
+    "reason": "checkmate"}`, and the result is saved to `Game.winner`.
+
+    Clients offering the `chess.binary` subprotocol send and receive moves
+    and snapshots as binary frames instead, see `apps.game.protocol`.
+
+    On join the player gets a `snapshot` of the position. A client that sees
+    a gap in `seq` sends `{"message": {"type": "resync", "seq": 12}}` and gets
+    the moves it missed in one `moves` frame, or a snapshot when the game no
+    longer buffers them. Reconnecting to `ws/play/<game_id>/?seq=12` does the
+    same on join.
+
+    `{"message": {"type": "targets", "square": "e2"}}` answers with the
+    squares the piece on `e2` can move to
+
+    `{"message": {"type": "bot"}}` asks the computer to play the next move.
+    A player has one request at most searching, cancelled when they leave.
+
+    The consumer is asynchronous: engine calls go through `run_engine` and
+    moves are saved in the background by `apps.game.persistence`, so one
+    worker can serve many sockets.
     """
 
-    def __init__(self, *args, **kwargs) -> None:
-        super().__init__(*args, **kwargs)
-        self.board = ChessEngine()
-        self.game = Game()
-
-
-
-    def connect(self):
-        self.accept()        
-        self.group_name = "chess"
-        async_to_sync(self.channel_layer.group_add)(
-                            self.group_name, 
-                            self.channel_name
-                        )
-        
-        # Load Game messages
-        if len(self.board.messages) > 1:
-            for message in self.board.messages:
-                self.channel_layer.group_send(self.group_name, {
-                    "type": "game_message",
-                    "message": message
-                })
-                self.send(json.dumps({
-                    "type": "game_message",
-                    "message": message
-                }))
-        else:
-            self.send(json.dumps({"type": "initial_messages", "message": self.board.messages}))
-        self.channel_layer.group_send(self.group_name,  {"type": "connection_success", "message": "Connection Establiched!"})
-        self.send(json.dumps({"type": "game_id", "message": f"{self.group_name}"}))
-        
+    bot_task = None
+
+    async def connect(self):
+        game_id = self.scope["url_route"]["kwargs"].get("game_id") or str(uuid.uuid4())
+
+        # A game nobody is playing here is picked up where it was saved,
+        # plus the moves still waiting to be saved
+        moves = ()
+        if game_id not in registry.games:
+            moves = await database_sync_to_async(move_writer.game_moves)(
+                game_id, stored_moves
+            )
+        self.live = registry.join(game_id, moves)
+        self.board = self.live.engine
+        self.group_name = self.live.group_name
+
+        # Clients asking for the binary protocol get it, the others JSON
+        self.binary = SUBPROTOCOL in self.scope.get("subprotocols", [])
+        await self.accept(subprotocol=SUBPROTOCOL if self.binary else None)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+
+        await self.send_json({"type": "game_id", "message": self.live.game_id})
+
+        # A reconnecting client passes the last `seq` it saw, `?seq=12`
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        seq = query.get("seq", [""])[0]
+        await self.resume(int(seq) if seq.isdigit() else None)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        # A binary frame is a move, see `apps.game.protocol`
+        if bytes_data is not None:
+            try:
+                start, end, promotion = decode_move(read_move(bytes_data))
+            except ValueError as error:
+                await self.send_json({"type": "error", "message": str(error)})
+                return
+            await self.play_move(start, end, promotion or QUEEN_CODE)
+            return
+
+        message = json.loads(text_data)["message"]
+
+        # Where can the piece on a square go
+        if message.get("type") == "targets":
+            square = SQUARES.get(str(message.get("square")))
+            if square is None:
+                await self.send_json(
+                    {"type": "error", "message": "Not a square of the board"}
+                )
+                return
+            # The engine is shared, a move played meanwhile would change the
+            # board under the search and the cached move lists
+            async with self.live.lock:
+                targets = await run_engine(
+                    self.board.legal_targets, [square // 8, square % 8]
+                )
+            await self.send_json(
+                {
+                    "type": "targets",
+                    "square": message["square"],
+                    "targets": [SQUARE_NAMES[row * 8 + col] for row, col in targets],
+                }
+            )
+            return
+
+        # The client missed moves, send them or the whole position again
+        if message.get("type") == "resync":
+            await self.resume(message.get("seq"))
+            return
 
-    
-    def receive(self, text_data=None):
-        text_data_json = json.loads(text_data)
-        message = text_data_json["message"]
+        # Let the computer play for the side to move, one search at a time
+        if message.get("type") == "bot":
+            if self.bot_task is not None and not self.bot_task.done():
+                await self.send_json(
+                    {"type": "error", "message": "The computer is already thinking"}
+                )
+                return
+            async with self.live.lock:
+                board = self.board.board.copy()
+            # Kept so the search is cancelled when the player leaves
+            self.bot_task = asyncio.get_running_loop().create_task(
+                self.fetch_bot_move(board)
+            )
+            return
 
         # Get move coordinates
-        from_pos = message["from"]
-        to_pos = message["to"]
+        from_pos, to_pos = message["from"], message["to"]
+        promotion = str(message.get("promotion") or "Q").upper()
+        if promotion not in PROMOTION_LETTERS:
+            await self.send_json(
+                {"type": "error", "message": f"Can't promote to {promotion}"}
+            )
+            return
+        await self.play_move(
+            RANKS_TO_ROWS[from_pos[1]] * 8 + FILES_TO_COLUMNS[from_pos[0]],
+            RANKS_TO_ROWS[to_pos[1]] * 8 + FILES_TO_COLUMNS[to_pos[0]],
+            PIECE_CODES[promotion],
+        )
 
-        start = [FILES_TO_COLUMNS[from_pos[0]], ROW_NAMES[from_pos[1]]]
-        end = [FILES_TO_COLUMNS[to_pos[0]], ROW_NAMES[to_pos[1]]]
+    async def play_move(self, start, end, promotion=QUEEN_CODE):
+        # Move the piece, one player at a time. The broadcast stays under the
+        # lock so the players get the moves in sequence order.
+        async with self.live.lock:
+            await self.play_locked(start, end, promotion)
 
-        # initialize board
-        board = self.board
+    async def play_locked(self, start, end, promotion):
+        """
+        Plays and broadcasts a move, the caller holding `live.lock`
+        """
         player = self.board.white_to_play
+        move = await run_engine(
+            self.board.make_move,
+            initial_pos=[start // 8, start % 8],
+            destination=[end // 8, end % 8],
+            promotion=promotion,
+        )
+        if move is None:
+            await self.send_json({"type": "error", "message": self.board.messages[-1]})
+            return
 
-
-        # Move the piece
-        board.make_move(initial_pos=start, destination=end)
+        # The pawn taken en passant isn't on the end square
+        captured = self.board.undo_stack[-1][0]
 
         # Log for debugging
-        print(f"{from_pos} {to_pos} by {'White' if player else 'Black'}")
+        print(
+            f"{SQUARE_NAMES[start]} {SQUARE_NAMES[end]} "
+            f"by {'White' if player else 'Black'}"
+        )
 
-        async_to_sync(self.channel_layer.group_send)(
-            self.group_name,
+        event = self.live.add_event(
             {
                 "type": "create_move",
-                "message": f"{from_pos} {to_pos} by {'White' if player else 'Black'}",
-                "game_id": str(self.game.game_id),
-                "game_messages": [m for m in self.board.messages],
-                "board": self.board.board,
+                "move": move,
+                "captured": captured,
+                "white_to_play": self.board.white_to_play,
+                "check": self.board.in_check(),
+                "message": self.board.messages[-1],
             }
         )
+        await self.channel_layer.group_send(self.group_name, event)
+
+        result = self.board.result
+        if result is not None:
+            await self.channel_layer.group_send(self.group_name, game_over_json(result))
+        await move_writer.add(
+            self.live.game_id,
+            move,
+            captured,
+            self.board.zobrist_key,
+            None if result is None else result.winner,
+        )
+
+    async def create_move(self, event):
+        # Only the move is sent, clients apply it to their own board
+        if self.binary:
+            await self.send(bytes_data=pack_event(event))
+        else:
+            await self.send_json(move_json(event))
+
+    async def game_over(self, event):
+        await self.send_json(event)
+
+    async def resume(self, seq):
+        """
+        Sends the moves after `seq` in one frame, or a snapshot when they
+        are no longer buffered or no `seq` was given, then the result if the
+        game is over
+        """
+        # Not while a move is half played in a worker thread
+        async with self.live.lock:
+            events = self.live.events_since(seq) if isinstance(seq, int) else None
+            if events is None:
+                await self.send_snapshot()
+            elif self.binary:
+                await self.send(bytes_data=b"".join(map(pack_event, events)))
+            else:
+                events = [move_json(event) for event in events]
+                await self.send_json({"type": "moves", "events": events})
+
+            if self.board.result is not None:
+                await self.send_json(game_over_json(self.board.result))
+
+    async def fetch_bot_move(self, board):
+        # The search runs in a worker process, the result comes back to this
+        # consumer as a `bot_move` event
+        try:
+            result = await bot_pool.request(board, settings.CHESS_BOT_MOVETIME_MS)
+        except BotBusy:
+            await self.send_json(
+                {"type": "error", "message": "The computer is busy, try again"}
+            )
+            return
+        except asyncio.TimeoutError:
+            await self.send_json(
+                {"type": "error", "message": "The computer ran out of time"}
+            )
+            return
+
+        await self.channel_layer.send(
+            self.channel_name,
+            {"type": "bot_move", "key": board.key, "move": result.move},
+        )
 
-    
-    def create_move(self, event):
-        move = event["message"]
-        game_id = event["game_id"]
-        messages = event["game_messages"]
-
-        self.send(text_data=json.dumps({
-            "type": "game",
-            "message": move,
-            "game_id": game_id,
-            "messages": messages
-        }))
-
-
-
-    def disconnect(self, code):
-        game_id = self.game.game_id
-        _game = Game.objects.create(game_id=game_id)
-        _game.save()
-        
-
-        game_moves = []
-        game_captures = []
-        
-        # Take the game moves
-        for move in self.board.moves_history:
-            board = self.board.board
-            color = ""
-            
-            # Add piece to moves
-            piece = board.board[move[0][0]][move[0][1]]
-            if self.get_isinstance_piece(piece):
-                color = "White" if piece.color else "Black"
-            color = ""
-            game_moves.append(
-                        Move(
-                            from_pos=f"{[move[0][0], move[0][1]]}", 
-                            to_pos=f"{[move[1][0], move[1][1]]}", 
-                            color=color
-                        )
-                    )
-
-        # Take the game captures
-        for capture in self.board.captures:
-            piece = board.board[capture[0][0]][capture[0][1]]
-            if self.get_isinstance_piece(piece):
-                color = "White" if piece.color else "Black"
-            color = ""
-            game_captures.append(
-                Capture(
-                    color = color
+    async def bot_move(self, event):
+        if event["move"] is None:
+            return
+        start, end, promotion = decode_move(event["move"])
+        # The position may have changed while the computer was thinking, or
+        # while this waited for the lock behind another player's move
+        async with self.live.lock:
+            if event["key"] == self.board.zobrist_key:
+                await self.play_locked(start, end, promotion or QUEEN_CODE)
+
+    async def disconnect(self, code):
+        if self.bot_task is not None:
+            self.bot_task.cancel()
+        if not hasattr(self, "live"):
+            return
+        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+        registry.leave(self.live)
+
+    async def send_snapshot(self):
+        if self.binary:
+            await self.send(
+                bytes_data=pack_snapshot(
+                    self.live.seq,
+                    self.board.board.squares,
+                    self.board.white_to_play,
                 )
             )
+        else:
+            await self.send_json(self.live.snapshot())
+
+    async def send_json(self, content):
+        await self.send(text_data=json.dumps(content))
+
+
+class PgnExportConsumer(AsyncHttpConsumer):
+    """
+    Streams every stored game as one PGN file, at `games/pgn/`
+
+    The games are read from a server side cursor in a worker thread and
+    sent as they are written, so memory doesn't grow with the number of
+    games. A plain streaming view would read the cursor on the event loop,
+    which Django doesn't allow under ASGI.
+    """
+
+    async def handle(self, body):
+        await self.send_headers(
+            headers=[
+                (b"Content-Type", b"application/x-chess-pgn"),
+                (b"Content-Disposition", b'attachment; filename="games.pgn"'),
+            ]
+        )
 
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue(maxsize=16)  # games waiting to be sent
+        stopped = False
 
+        def put(chunk):
+            asyncio.run_coroutine_threadsafe(chunks.put(chunk), loop).result()
 
-        # Bulk create moves and captures
-        this_game = get_object_or_404(Game, game_id=game_id)
-        this_game.moves.bulk_create(game_moves)
-        this_game.captures.bulk_create(game_captures)
-        this_game.save()
-        
-        
+        def produce():
+            try:
+                for text in export_games():
+                    if stopped:
+                        break
+                    put(text.encode())
+            finally:
+                db.connection.close()
+                put(None)
 
-    def get_isinstance_piece(self, piece):
-        if isinstance(piece, ChessPiece):
-           return True
-        return False
\ No newline at end of file
+        producer = loop.run_in_executor(None, produce)
+        chunk = None
+        try:
+            while (chunk := await chunks.get()) is not None:
+                await self.send_body(chunk, more_body=True)
+        finally:
+            # Let the thread finish if sending failed
+            stopped = True
+            while chunk is not None:
+                chunk = await chunks.get()
+            await producer
+        await self.send_body(b"")
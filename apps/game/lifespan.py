@@ -0,0 +1,18 @@
+from apps.game.bots import bot_pool
+from apps.game.persistence import move_writer
+
+
+async def lifespan(scope, receive, send):
+    """
+    Handles the ASGI lifespan protocol, so servers that support it let us
+    write the queued moves and stop the bot workers before exiting
+    """
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await move_writer.close()
+            bot_pool.shutdown()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
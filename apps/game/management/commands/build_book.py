@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.game.models import Game
+from chess.book import BLACK_WINS, DRAW, WHITE_WINS, count_moves, write_book
+from chess.constants import BLACK_WON, DRAWN, WHITE_WON
+
+# `Game.winner` -> book result
+RESULTS = {WHITE_WON: WHITE_WINS, DRAWN: DRAW, BLACK_WON: BLACK_WINS}
+
+
+class Command(BaseCommand):
+    """
+    Builds the opening book from the stored games
+    ---
+
+    `python manage.py build_book [--output book.bin] --max-ply 20 --min-games 2`
+
+    The first `--max-ply` moves of every finished game are tallied, import
+    archives with `import_pgn` first. Moves played fewer than `--min-games`
+    times are left out. The book is written to `CHESS_BOOK_PATH` unless
+    `--output` is given, running servers pick it up when restarted.
+    """
+
+    help = "Build the opening book from the stored games"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default=settings.CHESS_BOOK_PATH)
+        parser.add_argument("--max-ply", type=int, default=20)
+        parser.add_argument("--min-games", type=int, default=2)
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        if not options["output"]:
+            raise CommandError("Set CHESS_BOOK_PATH or give --output")
+        if options["max_ply"] < 1 or options["min_games"] < 1:
+            raise CommandError("Max ply and min games must be at least 1")
+
+        games = (
+            Game.objects.filter(winner__in=RESULTS)
+            .only("move_list", "winner")
+            .order_by("pk")
+            .iterator(chunk_size=options["batch_size"])
+        )
+        counts = count_moves(
+            ((game.moves, RESULTS[game.winner]) for game in games),
+            max_ply=options["max_ply"],
+        )
+        try:
+            records = write_book(counts, options["output"], options["min_games"])
+        except OSError as error:
+            raise CommandError(f"Can't write {options['output']}: {error}")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Wrote {records} book moves to {options['output']}")
+        )
@@ -0,0 +1,69 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.game.models import Game
+from apps.game.pgn import game_from_pgn
+from chess.pgn import PgnError, read_games
+
+
+class Command(BaseCommand):
+    """
+    Imports the games of PGN files
+    ---
+
+    `python manage.py import_pgn games.pgn [more.pgn ...] --batch-size 500`
+
+    Files are read one game at a time, so their size doesn't matter, and
+    `-` reads standard input. Every move is checked with `chess.engine`: a
+    game with an illegal move is reported and skipped. Games are inserted
+    `--batch-size` at a time, one transaction per batch.
+    """
+
+    help = "Import the games of PGN files"
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="PGN files, - for stdin")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("Batch size must be at least 1")
+
+        imported = skipped = 0
+        batch = []
+        for path in options["paths"]:
+            file = sys.stdin if path == "-" else self.open(path)
+            try:
+                for number, pgn in enumerate(read_games(file), 1):
+                    try:
+                        batch.append(game_from_pgn(pgn))
+                    except PgnError as error:
+                        skipped += 1
+                        self.stderr.write(f"{path}, game {number}: {error}")
+                        continue
+
+                    if len(batch) >= batch_size:
+                        imported += self.save(batch)
+                        batch = []
+            finally:
+                if file is not sys.stdin:
+                    file.close()
+
+        imported += self.save(batch)
+        self.stdout.write(
+            self.style.SUCCESS(f"Imported {imported} games, skipped {skipped}")
+        )
+
+    def open(self, path):
+        try:
+            return open(path, encoding="utf-8", errors="replace")
+        except OSError as error:
+            raise CommandError(f"Can't read {path}: {error}")
+
+    def save(self, batch) -> int:
+        with transaction.atomic():
+            Game.objects.bulk_create(batch)
+        return len(batch)
@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+
+from apps.game.models import Game, PositionIndex
+from apps.game.positions import position_rows
+
+
+class Command(BaseCommand):
+    """
+    Adds stored games to the position index
+    ---
+
+    `python manage.py index_positions --batch-size 200 [--rebuild]`
+
+    Games already indexed are skipped, so the command can be stopped and run
+    again. A game missing some plies, eg. one whose later moves were indexed
+    as they were played, is indexed again from its first ply, the rows it
+    has being kept.
+    `--rebuild` drops the index and builds it from scratch.
+    """
+
+    help = "Add the positions of stored games to the position index"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument(
+            "--rebuild", action="store_true", help="Index every game again"
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("Batch size must be at least 1")
+
+        if options["rebuild"]:
+            PositionIndex.objects.all().delete()
+
+        games = Game.objects.only("game_id", "move_list", "plies").order_by("pk")
+        batch = []
+        indexed = positions = 0
+        for game in games.iterator(chunk_size=batch_size):
+            batch.append(game)
+            if len(batch) >= batch_size:
+                positions += self.index(batch)
+                indexed += len(batch)
+                batch = []
+        positions += self.index(batch)
+        indexed += len(batch)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Indexed {positions} positions of {indexed} games")
+        )
+
+    def index(self, games) -> int:
+        """
+        Indexes the plies of `games` missing from the index, in one
+        transaction
+        """
+        indexed = dict(
+            PositionIndex.objects.filter(game__in=games)
+            .values("game_id")
+            .annotate(plies=Count("ply"))
+            .values_list("game_id", "plies")
+        )
+        rows = []
+        for game in games:
+            if indexed.get(game.pk, 0) < game.plies:
+                rows.extend(position_rows(game))
+
+        # Skip the rows already there, eg. the ones live games added
+        with transaction.atomic():
+            PositionIndex.objects.bulk_create(rows, ignore_conflicts=True)
+        return len(rows)
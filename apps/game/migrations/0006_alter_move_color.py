@@ -0,0 +1,18 @@
+# Generated by Django 4.0.6 on 2026-10-18 19:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("game", "0005_alter_capture_color"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="move",
+            name="color",
+            field=models.CharField(max_length=10),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.0.6 on 2026-10-18 19:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("game", "0006_alter_move_color"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="game",
+            name="capture_list",
+            field=models.BinaryField(default=bytes),
+        ),
+        migrations.AddField(
+            model_name="game",
+            name="move_list",
+            field=models.BinaryField(default=bytes),
+        ),
+        migrations.AddField(
+            model_name="game",
+            name="plies",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
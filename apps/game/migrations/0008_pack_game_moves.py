@@ -0,0 +1,173 @@
+import json
+import struct
+
+from django.db import migrations
+
+# Frozen copies of the encoding in `chess.moves` and `chess.constants`, so
+# the migration keeps working whatever becomes of the app code
+PIECE_CODES = {"P": 1, "N": 2, "B": 3, "R": 4, "Q": 5, "K": 6}
+CODES_TO_PIECES = {code: letter for letter, code in PIECE_CODES.items()}
+BLACK_PIECE = 8
+PIECE_TYPE = 7
+START_SQUARES = bytes(
+    [PIECE_CODES[letter] | BLACK_PIECE for letter in "RNBQKBNR"]
+    + [PIECE_CODES["P"] | BLACK_PIECE] * 8
+    + [0] * 32
+    + [PIECE_CODES["P"]] * 8
+    + [PIECE_CODES[letter] for letter in "RNBQKBNR"]
+)
+
+# Positions tried when putting a game's moves back in order
+MAX_NODES = 2000
+
+
+def encode_move(start, end) -> int:
+    return start | end << 6
+
+
+def decode_move(move):
+    return move & 63, move >> 6 & 63
+
+
+def pack_moves(moves) -> bytes:
+    return struct.pack(f">{len(moves)}H", *moves)
+
+
+def unpack_moves(data):
+    data = bytes(data)
+    return struct.unpack(f">{len(data) // 2}H", data)
+
+
+def parse_square(position):
+    """
+    The square of a stored `"[row, column]"`, `None` when it isn't one
+    """
+    try:
+        row, column = json.loads(position)
+    except (TypeError, ValueError):
+        return None
+    if not all(isinstance(value, int) and 0 <= value < 8 for value in (row, column)):
+        return None
+    return row * 8 + column
+
+
+def play_order(moves):
+    """
+    The rows were linked with `game.moves.add()`, which doesn't keep their
+    order. Returns the moves in an order where each one moves a piece of the
+    side to play, trying them as stored first, or as stored if there is
+    none within `MAX_NODES` positions.
+    """
+    squares = bytearray(START_SQUARES)
+    ordered = []
+    remaining = list(moves)
+    nodes = 0
+
+    def playable(move):
+        start, end = decode_move(move)
+        side = BLACK_PIECE if len(ordered) % 2 else 0
+        piece, target = squares[start], squares[end]
+        own_target = target and target & BLACK_PIECE == side
+        return piece and piece & BLACK_PIECE == side and not own_target
+
+    def search():
+        nonlocal nodes
+        if not remaining:
+            return True
+        nodes += 1
+        if nodes > MAX_NODES:
+            return False
+        for index, move in enumerate(remaining):
+            if move in remaining[:index] or not playable(move):
+                continue
+            start, end = decode_move(move)
+            taken = squares[end]
+            squares[end], squares[start] = squares[start], 0
+            ordered.append(remaining.pop(index))
+            if search():
+                return True
+            remaining.insert(index, ordered.pop())
+            squares[start], squares[end] = squares[end], taken
+        return False
+
+    return ordered if search() else list(moves)
+
+
+def pack_rows(apps, schema_editor):
+    """
+    Packs the `Move` and `Capture` rows of every game into its move list.
+    Rows that can't be read are left out and reported.
+    """
+    Game = apps.get_model("game", "Game")
+    for game in Game.objects.all().iterator():
+        moves = []
+        for row in (
+            Game.moves.through.objects.filter(game_id=game.pk)
+            .order_by("id")
+            .select_related("move")
+        ):
+            start = parse_square(row.move.from_pos)
+            end = parse_square(row.move.to_pos)
+            if start is None or end is None:
+                print(f"Game {game.pk}: skipped move {row.move.pk}")
+                continue
+            moves.append(encode_move(start, end))
+
+        captured = bytearray()
+        for row in (
+            Game.captures.through.objects.filter(game_id=game.pk)
+            .order_by("id")
+            .select_related("capture")
+        ):
+            code = PIECE_CODES.get(row.capture.captured_piece)
+            if code is None:
+                print(f"Game {game.pk}: skipped capture {row.capture.pk}")
+                continue
+            captured.append(
+                code if row.capture.color == "White" else code | BLACK_PIECE
+            )
+
+        game.move_list = pack_moves(play_order(moves))
+        game.capture_list = bytes(captured)
+        game.plies = len(moves)
+        game.save(update_fields=["move_list", "capture_list", "plies"])
+
+
+def unpack_rows(apps, schema_editor):
+    """
+    Recreates the `Move` and `Capture` rows from the move lists
+    """
+    Game = apps.get_model("game", "Game")
+    Move = apps.get_model("game", "Move")
+    Capture = apps.get_model("game", "Capture")
+    for game in Game.objects.all().iterator():
+        moves = []
+        for ply, move in enumerate(unpack_moves(game.move_list)):
+            start, end = decode_move(move)
+            moves.append(
+                Move(
+                    from_pos=f"{[start // 8, start % 8]}",
+                    to_pos=f"{[end // 8, end % 8]}",
+                    color="White" if ply % 2 == 0 else "Black",
+                )
+            )
+        captures = [
+            Capture(
+                captured_piece=CODES_TO_PIECES[code & PIECE_TYPE],
+                color="Black" if code & BLACK_PIECE else "White",
+            )
+            for code in bytes(game.capture_list)
+        ]
+        game.moves.add(*Move.objects.bulk_create(moves))
+        game.captures.add(*Capture.objects.bulk_create(captures))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("game", "0007_game_move_list"),
+    ]
+
+    operations = [
+        migrations.RunPython(pack_rows, unpack_rows),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.0.6 on 2026-10-18 19:12
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("game", "0008_pack_game_moves"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="game",
+            name="captures",
+        ),
+        migrations.RemoveField(
+            model_name="game",
+            name="moves",
+        ),
+        migrations.DeleteModel(
+            name="Capture",
+        ),
+        migrations.DeleteModel(
+            name="Move",
+        ),
+    ]
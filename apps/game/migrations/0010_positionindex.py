@@ -0,0 +1,44 @@
+# Generated by Django 4.0.6 on 2026-10-18 19:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("game", "0009_remove_game_captures_remove_game_moves_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PositionIndex",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.BigIntegerField(db_index=True)),
+                ("ply", models.PositiveIntegerField()),
+                (
+                    "game",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="positions",
+                        to="game.game",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="positionindex",
+            constraint=models.UniqueConstraint(
+                fields=("game", "ply"), name="unique_game_ply"
+            ),
+        ),
+    ]
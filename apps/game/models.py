@@ -1,56 +1,10 @@
 import uuid
 
 from django.db import models
+from django.utils.functional import cached_property
 
-
-class BaseGameModel(models.Model):
-    """
-    Model definition for BaseGameModel
-    ---
-
-    Contains an `id: uuid`
-    ---
-
-
-    This is just in case more fields will be required later for all our game models
-
-    """
-
-    id = models.CharField(
-        primary_key=True, default=uuid.uuid4, editable=False, max_length=300
-    )
-
-    class Meta:
-        abstract = True
-
-
-class Move(BaseGameModel):
-    """
-    Will record a move's initial and final location.
-    ---
-
-    `color: str`: The color of the moved piece
-
-    `from_pos: str`: Initial position eg. "[4, 3]"
-
-    `to_pos: str`: Destination position eg. "[3, 3]"
-    """
-
-    from_pos = models.CharField(max_length=10)
-    to_pos = models.CharField(max_length=10)
-    color = models.CharField(max_length=10)
-
-
-class Capture(BaseGameModel):
-    """
-    Will keep track of captured pieces of any game.
-    ---
-
-    `color: str`: The color of the captured piece
-    """
-
-    captured_piece = models.CharField(max_length=10)
-    color = models.CharField(max_length=10)
+from chess.moves import pack_moves, unpack_moves
+from chess.pieces import PIECES
 
 
 class Game(models.Model):
@@ -62,16 +16,24 @@ class Game(models.Model):
     ---
     A game has two players, moves and captures
 
-    `moves: [Move]`: A list containing all the moves
+    `move_list: bytes`: The moves played, two bytes each, see
+    `chess.moves.pack_moves`
+
+    `capture_list: bytes`: The code of each piece captured, one byte each
 
-    `captures: [Capture]`: A list of all captures within the board
+    `plies: int`: Number of moves in `move_list`
 
     `game_id: uuid`: A unique UUID Field for each game
 
-    `winner: str`: The color of the winner (White/Black)
+    `winner: str`: The color of the winner (White/Black), or Draw, once the
+    game is over
 
     Properties
     ---
+    `@moves: array`: The encoded moves, decoded from `move_list` on first use
+
+    `@captures: [ChessPiece]`: The captured pieces
+
     `@moves_count: int`: Get total moves within the game
 
     `@captures_count: int`: Get total captures within the game
@@ -88,15 +50,63 @@ class Game(models.Model):
     game_id = models.CharField(
         primary_key=True, default=uuid.uuid4, editable=True, max_length=200
     )
-    moves = models.ManyToManyField(Move)
-    captures = models.ManyToManyField(Capture)
+    move_list = models.BinaryField(default=bytes)
+    capture_list = models.BinaryField(default=bytes)
+    plies = models.PositiveIntegerField(default=0)
 
     winner = models.CharField(blank=True, null=True, max_length=10)
 
+    @cached_property
+    def moves(self):
+        return unpack_moves(self.move_list)
+
+    @property
+    def captures(self):
+        return [PIECES[code] for code in bytes(self.capture_list)]
+
     @property
     def moves_count(self):
-        return self.moves.count()
+        return self.plies
 
     @property
     def captures_count(self):
-        return self.captures.count()
+        return len(self.capture_list)
+
+    def add_moves(self, moves, captured=b"") -> None:
+        """
+        Appends encoded moves, and the codes of the pieces they captured
+        """
+        self.move_list = bytes(self.move_list) + pack_moves(moves)
+        self.capture_list = bytes(self.capture_list) + bytes(captured)
+        self.plies += len(moves)
+        self.__dict__.pop("moves", None)
+
+
+class PositionIndex(models.Model):
+    """
+    Which games went through a position, and when
+    ---
+
+    `key: int`: The Zobrist key of the position, stored signed to fit a
+    `bigint`, see `db_key()`
+
+    `game: Game`: A game the position was reached in
+
+    `ply: int`: Moves played in the game when it was reached
+    """
+
+    key = models.BigIntegerField(db_index=True)
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name="positions")
+    ply = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["game", "ply"], name="unique_game_ply")
+        ]
+
+    @staticmethod
+    def db_key(key) -> int:
+        """
+        The signed 64 bit value stored for a Zobrist key
+        """
+        return key - (1 << 64) if key >= 1 << 63 else key
@@ -0,0 +1,269 @@
+"""
+  Write-behind persistence of the moves played.
+
+  Consumers hand every move to `move_writer` as it is played and carry on.
+  One background task appends the waiting moves of all games to their
+  packed move lists together, in a single transaction, every
+  `CHESS_PERSIST_FLUSH_MS` or as soon as `CHESS_PERSIST_BATCH` moves wait,
+  instead of one round trip per move.
+"""
+import asyncio
+import atexit
+import logging
+import threading
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import DataError, IntegrityError, transaction
+
+from apps.game.models import Game, PositionIndex
+
+logger = logging.getLogger(__name__)
+
+# Errors of the rows written rather than of the database: retrying the same
+# moves fails again
+REFUSED = (IntegrityError, DataError)
+
+# Longest wait between two writes while the database is failing
+MAX_DELAY_MS = 30000
+
+
+def write_moves(batch) -> None:
+    """
+    Appends `(game_id, move, captured, key, winner)` entries to the move
+    lists of their games in one transaction, creating the games that have
+    no row yet, and indexes the position `key` each move led to. `winner`
+    is set on the last move of a game, `None` on the others.
+    """
+    moves, captures, keys, winners = {}, {}, {}, {}
+    for game_id, move, captured, key, winner in batch:
+        moves.setdefault(game_id, []).append(move)
+        keys.setdefault(game_id, []).append(key)
+        if captured:
+            captures.setdefault(game_id, bytearray()).append(captured)
+        if winner is not None:
+            winners[game_id] = winner
+
+    with transaction.atomic():
+        Game.objects.bulk_create(
+            [Game(game_id=game_id) for game_id in moves], ignore_conflicts=True
+        )
+        games = Game.objects.select_for_update().in_bulk(list(moves))
+        positions = []
+        for game_id, game_moves in moves.items():
+            game = games[game_id]
+            positions.extend(
+                PositionIndex(key=PositionIndex.db_key(key), game=game, ply=ply)
+                for ply, key in enumerate(keys[game_id], game.plies + 1)
+            )
+            game.add_moves(game_moves, captures.get(game_id, b""))
+            game.winner = winners.get(game_id, game.winner)
+        Game.objects.bulk_update(
+            games.values(), ["move_list", "capture_list", "plies", "winner"]
+        )
+        PositionIndex.objects.bulk_create(positions)
+
+
+class MoveWriter:
+    """
+    Queues played moves and writes them in batches
+    ---
+
+    `flush_ms: int`: Longest a move waits before it is written
+
+    `batch_size: int`: Moves waiting that trigger a write straight away
+
+    `max_pending: int`: Moves kept in memory at most. When the database
+    falls this far behind, `add()` waits for a write before queueing more,
+    so players are slowed down rather than memory growing.
+
+    `retries: int`: Times the moves of a game may be refused by the
+    database, eg. with an `IntegrityError`, before they are dropped
+
+    A write that fails for any other reason, the database being down for
+    one, is retried with a growing delay and never loses a move. Moves the
+    database refuses are dropped with the rest of their game, since a move
+    list can't have a gap: the game is then `broken` and its later moves
+    are dropped too. Dropped moves are logged and counted in `dropped`.
+
+    Methods
+    ---
+    `add(game_id, move, captured, key, winner)`: Queues a move, `captured` is
+    the code of the piece it took, `EMPTY` for none, `key` the Zobrist key
+    of the position it led to and `winner` the result when it ended the
+    game
+
+    `flush()`: Writes every waiting move now. Registered with `atexit` and
+    called from the ASGI lifespan shutdown, so moves aren't lost on exit.
+
+    `game_moves(game_id, load)`: The moves `load(game_id)` reads from the
+    database followed by the ones still queued, without a write in between
+    """
+
+    def __init__(self, flush_ms, batch_size, max_pending, retries=3) -> None:
+        self.flush_ms = flush_ms
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.retries = retries
+        self.lock = threading.Lock()
+        # Held for a whole write, so nobody sees moves neither queued nor saved
+        self.writing = threading.Lock()
+        self.pending = []
+        self.failures = {}
+        self.broken = set()
+        self.dropped = 0
+        self.wakeup = None
+        self.task = None
+
+    async def add(self, game_id, move, captured, key, winner=None) -> None:
+        # The move is already played and sent: while the database is behind
+        # the player waits, a failed write is the writer's to retry
+        delay = self.flush_ms
+        while len(self.pending) >= self.max_pending:
+            try:
+                await self.flush_async()
+            except Exception:
+                logger.exception("Saving moves failed, %d waiting", len(self.pending))
+                await asyncio.sleep(delay / 1000)
+                delay = min(delay * 2, MAX_DELAY_MS)
+
+        with self.lock:
+            self.pending.append((game_id, move, captured, key, winner))
+            waiting = len(self.pending)
+
+        self.start()
+        if waiting >= self.batch_size:
+            self.wakeup.set()
+
+    def start(self) -> None:
+        if self.task is None or self.task.done():
+            self.wakeup = asyncio.Event()
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def run(self) -> None:
+        delay = self.flush_ms
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), delay / 1000)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            if not self.pending:
+                continue
+
+            # Failed moves stay queued and are retried, less often while
+            # the database keeps failing
+            try:
+                await self.flush_async()
+            except Exception:
+                logger.exception("Saving moves failed, %d waiting", len(self.pending))
+                delay = min(delay * 2, MAX_DELAY_MS)
+            else:
+                delay = self.flush_ms
+
+    def flush(self) -> int:
+        """
+        Writes the waiting moves, returns how many were written
+        """
+        with self.writing:
+            return self.write_pending()
+
+    def write_pending(self) -> int:
+        with self.lock:
+            batch, self.pending = self.pending, []
+        batch = self.without_broken(batch)
+        if not batch:
+            return 0
+
+        try:
+            write_moves(batch)
+        except REFUSED:
+            return self.write_each_game(batch)
+        except Exception:
+            # Back in front, the moves of a game are appended in order
+            self.requeue(batch)
+            raise
+        self.failures.clear()
+        return len(batch)
+
+    def write_each_game(self, batch) -> int:
+        """
+        Writes a batch the database refused one game at a time, to find the
+        games at fault
+        """
+        games = {}
+        for entry in batch:
+            games.setdefault(entry[0], []).append(entry)
+
+        written = 0
+        retry = []
+        games = list(games.items())
+        for index, (game_id, moves) in enumerate(games):
+            try:
+                write_moves(moves)
+            except REFUSED:
+                failures = self.failures[game_id] = self.failures.get(game_id, 0) + 1
+                if failures < self.retries:
+                    retry.extend(moves)
+                else:
+                    self.drop_game(game_id, len(moves))
+            except Exception:
+                for _, left in games[index:]:
+                    retry.extend(left)
+                self.requeue(retry)
+                raise
+            else:
+                self.failures.pop(game_id, None)
+                written += len(moves)
+        self.requeue(retry)
+        return written
+
+    def game_moves(self, game_id, load):
+        with self.writing:
+            moves = list(load(game_id))
+            with self.lock:
+                moves.extend(entry[1] for entry in self.pending if entry[0] == game_id)
+        return moves
+
+    def drop_game(self, game_id, count) -> None:
+        """
+        Gives up on the moves of `game_id`, the ones queued and to come
+        """
+        logger.error("Dropped %d moves of game %s, it won't be saved", count, game_id)
+        self.failures.pop(game_id, None)
+        self.broken.add(game_id)
+        self.dropped += count
+        with self.lock:
+            self.pending = self.without_broken(self.pending)
+
+    def without_broken(self, batch):
+        if not self.broken:
+            return batch
+        kept = [entry for entry in batch if entry[0] not in self.broken]
+        self.dropped += len(batch) - len(kept)
+        return kept
+
+    def requeue(self, batch) -> None:
+        with self.lock:
+            self.pending[:0] = batch
+
+    async def flush_async(self) -> int:
+        return await database_sync_to_async(self.flush)()
+
+    async def close(self) -> None:
+        """
+        Stops the background task and writes what is left
+        """
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        await self.flush_async()
+
+
+move_writer = MoveWriter(
+    flush_ms=settings.CHESS_PERSIST_FLUSH_MS,
+    batch_size=settings.CHESS_PERSIST_BATCH,
+    max_pending=settings.CHESS_PERSIST_MAX_PENDING,
+    retries=settings.CHESS_PERSIST_RETRIES,
+)
+atexit.register(move_writer.flush)
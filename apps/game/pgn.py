@@ -0,0 +1,66 @@
+"""
+  Converting between `Game` rows and PGN, see `chess.pgn`
+"""
+from apps.game.models import Game
+from chess.constants import BLACK_WON, DRAWN, WHITE_WON
+from chess.engine import ChessBoard, ChessEngine
+from chess.moves import pack_moves
+from chess.pgn import PgnError, parse_san, san, write_game
+
+# PGN result -> `Game.winner`
+WINNERS = {"1-0": WHITE_WON, "0-1": BLACK_WON, "1/2-1/2": DRAWN}
+RESULTS = {winner: result for result, winner in WINNERS.items()}
+
+
+def game_from_pgn(pgn) -> Game:
+    """
+    Builds an unsaved `Game` from a `chess.pgn.PgnGame`, playing every move
+    on a `ChessEngine`. Raises `PgnError` for an illegal move.
+    """
+    if pgn.headers.get("SetUp") == "1" or "FEN" in pgn.headers:
+        raise PgnError("Games from a set up position can't be stored")
+
+    engine = ChessEngine()
+    for text in pgn.sans():
+        engine.push(parse_san(engine.board, text))
+
+    return Game(
+        move_list=pack_moves(engine.moves_history),
+        capture_list=bytes(piece.code for piece in engine.captures),
+        plies=len(engine.moves_history),
+        winner=WINNERS.get(pgn.headers.get("Result")),
+    )
+
+
+def game_to_pgn(game) -> str:
+    """
+    Writes a `Game` as PGN, the moves replayed to put them in SAN
+    """
+    board = ChessBoard()
+    sans = []
+    for move in game.moves:
+        sans.append(san(board, move))
+        board.play(move)
+
+    result = RESULTS.get(game.winner, "*")
+    headers = {
+        "Event": "?",
+        "Site": "?",
+        "Date": "????.??.??",
+        "Round": "?",
+        "White": "?",
+        "Black": "?",
+        "Result": result,
+        "GameId": game.game_id,
+    }
+    return write_game(headers, sans, result)
+
+
+def export_games(chunk_size=200):
+    """
+    Yields every stored game as PGN. The games are read through a server
+    side cursor where the database has them, `chunk_size` rows at a time.
+    """
+    games = Game.objects.only("game_id", "move_list", "winner").order_by("pk")
+    for game in games.iterator(chunk_size=chunk_size):
+        yield game_to_pgn(game)
@@ -0,0 +1,52 @@
+"""
+  The position index: the Zobrist key of every position reached in every
+  stored game, so the games that went through a position are one indexed
+  lookup away.
+
+  Live games add their rows as their moves are saved, see
+  `apps.game.persistence`. Imported games and games saved before the index
+  existed are added with `manage.py index_positions`.
+"""
+from django.db.models import IntegerField, Value
+
+from apps.game.models import Game, PositionIndex
+from chess.engine import ChessBoard
+
+# Every game starts here: its ply 0 isn't stored, see `find_games()`
+START_KEY = ChessBoard().key
+
+
+def position_rows(game, start_ply=0):
+    """
+    Replays `game` and returns the unsaved `PositionIndex` rows of the
+    positions after ply `start_ply`. The start position, shared by every
+    game, isn't indexed.
+    """
+    board = ChessBoard()
+    rows = []
+    for ply, move in enumerate(game.moves, 1):
+        board.play(move)
+        if ply > start_ply:
+            rows.append(
+                PositionIndex(key=PositionIndex.db_key(board.key), game=game, ply=ply)
+            )
+    return rows
+
+
+def find_games(key, limit=100):
+    """
+    Returns how many times the position with Zobrist `key` was reached in
+    stored games, and the first `limit` `(game_id, ply)` pairs. The start
+    position is reached by every game at ply 0, on top of the rows of the
+    games that came back to it.
+    """
+    found = PositionIndex.objects.filter(key=PositionIndex.db_key(key))
+    pairs = found.values_list("game_id", "ply")
+    count = found.count()
+    if key == START_KEY:
+        starts = Game.objects.annotate(
+            ply=Value(0, output_field=IntegerField())
+        ).values_list("game_id", "ply")
+        pairs = starts.union(pairs, all=True)
+        count += Game.objects.count()
+    return count, list(pairs.order_by("game_id", "ply")[:limit])
@@ -0,0 +1,81 @@
+"""
+  The binary websocket protocol, negotiated with the `chess.binary`
+  subprotocol. Sockets without it keep using JSON text frames.
+
+  Client to server, a binary frame is one move: 2 bytes, big endian, the
+  move encoded as in `chess.moves` (start square, end square and promotion
+  bits). Other requests (`targets`, `bot`, `resync`) stay JSON text frames.
+
+  Server to client, a binary frame starts with its kind:
+
+  `MOVE`: `kind, seq (4 bytes), move (2 bytes), flags` where the low four
+  bits of `flags` are the code of the captured piece, `SIDE_BLACK` is set
+  when black is to move and `CHECK` when the move gives check, 8 bytes in
+  all
+
+  A resuming client gets the moves it missed as one frame of `MOVE`
+  records back to back
+
+  `SNAPSHOT`: `kind, seq (4 bytes), flags`, then the 64 piece codes packed
+  two to a byte, the first square of a pair in the high nibble, 38 bytes
+
+  Errors, the game id and the end of the game stay JSON text frames.
+"""
+import struct
+
+SUBPROTOCOL = "chess.binary"
+
+MOVE = 1
+SNAPSHOT = 2
+
+SIDE_BLACK = 0x80
+CHECK = 0x10
+CAPTURED = 0x0F
+
+CLIENT_MOVE = struct.Struct(">H")
+MOVE_FRAME = struct.Struct(">BIHB")
+SNAPSHOT_HEADER = struct.Struct(">BIB")
+
+
+def read_move(data) -> int:
+    """
+    Returns the encoded move of a client's binary frame
+    """
+    if len(data) != CLIENT_MOVE.size:
+        raise ValueError(f"A move is {CLIENT_MOVE.size} bytes, got {len(data)}")
+    return CLIENT_MOVE.unpack(data)[0]
+
+
+def pack_move(seq, move, captured, white_to_play, check=False) -> bytes:
+    flags = captured & CAPTURED | (0 if white_to_play else SIDE_BLACK)
+    if check:
+        flags |= CHECK
+    return MOVE_FRAME.pack(MOVE, seq, move, flags)
+
+
+def unpack_move(data):
+    """
+    Returns the `(seq, move, captured, white_to_play, check)` of a `MOVE`
+    frame
+    """
+    _, seq, move, flags = MOVE_FRAME.unpack(data)
+    return seq, move, flags & CAPTURED, not flags & SIDE_BLACK, bool(flags & CHECK)
+
+
+def pack_snapshot(seq, squares, white_to_play) -> bytes:
+    header = SNAPSHOT_HEADER.pack(SNAPSHOT, seq, 0 if white_to_play else SIDE_BLACK)
+    return header + bytes(
+        squares[square] << 4 | squares[square + 1] for square in range(0, 64, 2)
+    )
+
+
+def unpack_snapshot(data):
+    """
+    Returns the `(seq, squares, white_to_play)` of a `SNAPSHOT` frame
+    """
+    _, seq, flags = SNAPSHOT_HEADER.unpack_from(data)
+    squares = bytearray()
+    for pair in data[SNAPSHOT_HEADER.size :]:
+        squares.append(pair >> 4)
+        squares.append(pair & 0x0F)
+    return seq, squares, not flags & SIDE_BLACK
@@ -0,0 +1,155 @@
+import asyncio
+from collections import deque
+
+from django.conf import settings
+
+from apps.game.replay import replay_engine
+from chess.constants import BLACK, WHITE
+from chess.pieces import PIECES
+
+
+def piece_name(code):
+    """
+    The name of the piece with `code`, like `"wP"`, or `None` for a blank
+    """
+    piece = PIECES.get(code)
+    if piece is None:
+        return None
+    return f"{WHITE if piece.color else BLACK}{piece}"
+
+
+def board_state(board):
+    """
+    The squares, `a8` first, and side to move of a board, as sent to clients
+    """
+    return {
+        "squares": [piece_name(code) for code in board.squares],
+        "side_to_move": WHITE if board.white_to_play else BLACK,
+    }
+
+
+class LiveGame:
+    """
+    A game being played in this process
+    ---
+
+    `game_id: str`: The id from the websocket URL, also the `Game` primary key
+
+    `engine: ChessEngine`: The one engine every player of the game shares,
+    with the `moves` already stored for the game replayed on it
+
+    `lock: asyncio.Lock`: Held while a move is validated and played, so two
+    players can't move at the same time
+
+    `players: int`: Open sockets on the game
+
+    `seq: int`: Sequence number of the last move broadcast, so clients can
+    tell when they missed one and ask for a `snapshot()`
+
+    `events: deque`: The last move events broadcast, a ring buffer a
+    reconnecting client resumes from, see `events_since()`
+    """
+
+    def __init__(self, game_id, buffer=256, moves=()) -> None:
+        self.game_id = game_id
+        self.engine = replay_engine(moves)
+        self.lock = asyncio.Lock()
+        self.players = 0
+        self.seq = len(moves)
+        self.events = deque(maxlen=buffer)
+        self.drop_handle = None
+
+    @property
+    def group_name(self) -> str:
+        return f"game_{self.game_id}"
+
+    def add_event(self, event):
+        """
+        Numbers a move event and keeps it for resuming clients
+        """
+        self.seq += 1
+        event["seq"] = self.seq
+        self.events.append(event)
+        return event
+
+    def events_since(self, seq):
+        """
+        The events after `seq`, or `None` when they are no longer buffered
+        and the client needs a `snapshot()` instead
+        """
+        if seq == self.seq:
+            return []
+        if seq > self.seq or seq < self.seq - len(self.events):
+            return None
+        return list(self.events)[len(self.events) - (self.seq - seq) :]
+
+    def snapshot(self):
+        """
+        The full position, sent on join and when a client asks to resync
+        """
+        return {
+            "type": "snapshot",
+            "seq": self.seq,
+            **board_state(self.engine.board),
+        }
+
+
+class GameRegistry:
+    """
+    Maps `game_id` to its `LiveGame` for every game with a player connected
+    ---
+
+    Only touched from the event loop, so it needs no locking of its own.
+
+    `buffer: int`: Move events each game keeps for reconnecting clients
+
+    `linger_s: int`: Seconds a game stays after its last player left, so a
+    player whose connection dropped can resume it
+
+    `join(game_id, moves)`: Returns the live game, creating it from the
+    stored `moves` for the first player
+
+    `leave(game)`: Returns `True` when the last player left. The game is
+    dropped from the registry `linger_s` later if nobody joined again.
+    """
+
+    def __init__(self, buffer=256, linger_s=0) -> None:
+        self.games = {}
+        self.buffer = buffer
+        self.linger_s = linger_s
+
+    def join(self, game_id, moves=()) -> LiveGame:
+        game = self.games.get(game_id)
+        if game is None:
+            game = self.games[game_id] = LiveGame(game_id, self.buffer, moves)
+        if game.drop_handle is not None:
+            game.drop_handle.cancel()
+            game.drop_handle = None
+        game.players += 1
+        return game
+
+    def leave(self, game) -> bool:
+        game.players -= 1
+        if game.players > 0:
+            return False
+        if self.linger_s > 0:
+            game.drop_handle = asyncio.get_running_loop().call_later(
+                self.linger_s, self.drop, game
+            )
+        else:
+            self.drop(game)
+        return True
+
+    def drop(self, game) -> None:
+        game.drop_handle = None
+        if game.players == 0 and self.games.get(game.game_id) is game:
+            del self.games[game.game_id]
+
+    def __len__(self) -> int:
+        return len(self.games)
+
+
+registry = GameRegistry(
+    buffer=settings.CHESS_EVENT_BUFFER,
+    linger_s=settings.CHESS_GAME_LINGER_S,
+)
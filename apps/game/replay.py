@@ -0,0 +1,111 @@
+"""
+  Rebuilding stored games.
+
+  `GameReplay` keeps a copy of the board every `CHESS_REPLAY_CHECKPOINT`
+  plies, so the position at any ply costs at most that many moves from the
+  nearest checkpoint instead of a replay from the start. Replays of
+  recently viewed games are kept in `replays`.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from apps.game.models import Game
+from chess.engine import ChessBoard, ChessEngine
+
+
+def replay_engine(moves) -> ChessEngine:
+    """
+    Returns a `ChessEngine` with the encoded `moves` played from the start,
+    its `result` set when they ended the game
+    """
+    engine = ChessEngine()
+    for move in moves:
+        engine.push(move)
+    engine.result = engine.outcome()
+    return engine
+
+
+class GameReplay:
+    """
+    `moves: array`: The encoded moves of the game
+
+    `interval: int`: Plies between two checkpoints
+
+    `position_at(ply)`: The `ChessBoard` after the first `ply` moves
+
+    `extend(moves)`: Takes the longer move list of a game still being played
+    """
+
+    def __init__(self, moves, interval=16) -> None:
+        self.moves = moves
+        self.interval = interval
+        self.checkpoints = [ChessBoard()]  # the board at plies 0, K, 2K...
+        self.lock = threading.Lock()
+
+    @property
+    def plies(self) -> int:
+        return len(self.moves)
+
+    def extend(self, moves) -> None:
+        # Stored games only ever grow, so the checkpoints stay valid
+        self.moves = moves
+
+    def position_at(self, ply) -> ChessBoard:
+        if not 0 <= ply <= self.plies:
+            raise IndexError(f"Ply {ply} is not in a game of {self.plies} plies")
+
+        with self.lock:
+            # Add the checkpoints up to this ply
+            while len(self.checkpoints) <= ply // self.interval:
+                start = (len(self.checkpoints) - 1) * self.interval
+                board = self.checkpoints[-1].copy()
+                for move in self.moves[start : start + self.interval]:
+                    board.play(move)
+                self.checkpoints.append(board)
+            board = self.checkpoints[ply // self.interval].copy()
+
+        for move in self.moves[ply - ply % self.interval : ply]:
+            board.play(move)
+        return board
+
+
+class ReplayCache:
+    """
+    The replays of the last `size` games asked for, least recently used
+    first out
+    """
+
+    def __init__(self, size, interval) -> None:
+        self.size = size
+        self.interval = interval
+        self.replays = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, game) -> GameReplay:
+        moves = game.moves
+        with self.lock:
+            replay = self.replays.get(game.pk)
+            if replay is None or replay.plies > len(moves):
+                replay = self.replays[game.pk] = GameReplay(moves, self.interval)
+            elif replay.plies < len(moves):
+                replay.extend(moves)
+            self.replays.move_to_end(game.pk)
+            while len(self.replays) > self.size:
+                self.replays.popitem(last=False)
+        return replay
+
+
+replays = ReplayCache(
+    size=settings.CHESS_REPLAY_CACHE_GAMES,
+    interval=settings.CHESS_REPLAY_CHECKPOINT,
+)
+
+
+def stored_moves(game_id):
+    """
+    The encoded moves saved for `game_id`, empty for an unknown game
+    """
+    game = Game.objects.filter(pk=game_id).only("move_list").first()
+    return game.moves if game is not None else ()
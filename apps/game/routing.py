@@ -1,9 +1,13 @@
-from django.urls import re_path
-
-from apps.game.consumers import MovesConsumer
-
+from django.urls import path, re_path
 
+from apps.game.consumers import MovesConsumer, PgnExportConsumer
 
 websocket_urlpatterns = [
+    re_path(r"ws/play/(?P<game_id>[\w-]{1,64})/$", MovesConsumer.as_asgi()),
     re_path("ws/play/$", MovesConsumer.as_asgi()),
 ]
+
+# Served by consumers ahead of the django views
+http_urlpatterns = [
+    path("games/pgn/", PgnExportConsumer.as_asgi(), name="export-pgn"),
+]
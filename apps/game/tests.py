@@ -0,0 +1,440 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from unittest import mock
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError
+from django.test import SimpleTestCase, TestCase
+
+from apps.game.bots import BotBusy, BotPool
+from apps.game.models import Game, PositionIndex
+from apps.game.persistence import MoveWriter, move_writer, write_moves
+from apps.game.positions import START_KEY, find_games, position_rows
+from apps.game.protocol import (
+    CLIENT_MOVE,
+    pack_move,
+    pack_snapshot,
+    read_move,
+    unpack_move,
+    unpack_snapshot,
+)
+from apps.game.registry import LiveGame, registry
+from apps.game.replay import GameReplay, replay_engine
+from apps.game.routing import websocket_urlpatterns
+from chess.constants import SQUARES
+from chess.engine import ChessBoard, ChessEngine
+from chess.fen import START_FEN
+from chess.moves import encode_move
+
+
+class ProtocolTestCase(SimpleTestCase):
+    def test_move_round_trip(self):
+        move = encode_move(SQUARES["e4"], SQUARES["d5"])
+        self.assertEqual(read_move(CLIENT_MOVE.pack(move)), move)
+        frame = pack_move(70000, move, 9, False)
+        self.assertEqual(len(frame), 8)
+        self.assertEqual(unpack_move(frame), (70000, move, 9, False, False))
+        frame = pack_move(1, move, 0, True, check=True)
+        self.assertEqual(unpack_move(frame), (1, move, 0, True, True))
+
+    def test_snapshot_round_trip(self):
+        engine = ChessEngine()
+        engine.make_move([6, 4], [4, 4])
+        frame = pack_snapshot(1, engine.board.squares, engine.white_to_play)
+        self.assertEqual(len(frame), 38)
+        self.assertEqual(unpack_snapshot(frame), (1, engine.board.squares, False))
+
+
+class EventBufferTestCase(SimpleTestCase):
+    def test_events_since(self):
+        game = LiveGame("test", buffer=3)
+        for move in range(5):
+            game.add_event({"move": move})
+        self.assertEqual(game.events_since(5), [])
+        self.assertEqual([event["seq"] for event in game.events_since(2)], [3, 4, 5])
+        self.assertIsNone(game.events_since(1))  # no longer buffered
+        self.assertIsNone(game.events_since(6))  # ahead of the game
+
+
+class ReplayTestCase(TestCase):
+    def setUp(self):
+        # A short game, played from search results so it has captures
+        engine = ChessEngine()
+        for _ in range(12):
+            engine.push(engine.search(max_depth=2).move)
+        self.moves = list(engine.moves_history)
+        self.keys = []
+        while engine.moves_history:
+            self.keys.insert(0, engine.zobrist_key)
+            engine.pop()
+        write_moves(
+            [
+                ("replayed", move, 0, key, None)
+                for move, key in zip(self.moves, self.keys)
+            ]
+        )
+
+    def test_position_at_every_ply(self):
+        replay = GameReplay(self.moves, interval=5)
+        for ply in (12, 0, 7, 5, 11, 3):
+            with self.subTest(ply=ply):
+                board = replay_engine(self.moves[:ply]).board
+                self.assertEqual(replay.position_at(ply).squares, board.squares)
+                self.assertEqual(replay.position_at(ply).key, board.key)
+
+    def test_position_index(self):
+        game = Game.objects.get(pk="replayed")
+        rows = position_rows(game)
+        self.assertEqual(
+            [row.key for row in rows], list(map(PositionIndex.db_key, self.keys))
+        )
+        self.assertEqual(len(position_rows(game, start_ply=10)), 2)
+
+        fen = replay_engine(self.moves[:5]).to_fen()
+        response = self.client.get("/positions/", {"fen": fen}).json()
+        self.assertEqual(response["games"], [{"game_id": "replayed", "ply": 5}])
+        self.assertEqual(self.client.get("/positions/").status_code, 400)
+        # Every game went through the start position, at ply 0
+        response = self.client.get("/positions/", {"fen": START_FEN}).json()
+        self.assertEqual(response["count"], 1)
+        self.assertEqual(response["games"], [{"game_id": "replayed", "ply": 0}])
+        for key in ("-1", "1" + "0" * 16):
+            response = self.client.get("/positions/", {"key": key})
+            self.assertEqual(response.status_code, 400)
+
+    def test_index_missing_plies(self):
+        # As if only the moves played live after a restart were indexed
+        PositionIndex.objects.filter(game_id="replayed", ply__lte=5).delete()
+        call_command("index_positions", stdout=StringIO())
+        plies = PositionIndex.objects.filter(game_id="replayed").order_by("ply")
+        self.assertEqual(list(plies.values_list("ply", flat=True)), list(range(1, 13)))
+
+    def test_position_endpoint(self):
+        response = self.client.get("/games/replayed/position/", {"ply": 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["plies"], 12)
+        self.assertEqual(response.json()["side_to_move"], "b")
+        self.assertEqual(
+            self.client.get("/games/replayed/position/", {"ply": 13}).status_code,
+            400,
+        )
+
+
+class MoveStorageTestCase(TestCase):
+    def test_batches_append_to_the_move_list(self):
+        e2e4 = encode_move(SQUARES["e2"], SQUARES["e4"])
+        d7d5 = encode_move(SQUARES["d7"], SQUARES["d5"])
+        e4d5 = encode_move(SQUARES["e4"], SQUARES["d5"])
+        write_moves(
+            [
+                ("first", e2e4, 0, 1, None),
+                ("second", e2e4, 0, 1, None),
+                ("first", d7d5, 0, 2, None),
+            ]
+        )
+        write_moves([("first", e4d5, 9, (1 << 64) - 1, "White")])
+
+        game = Game.objects.get(pk="first")
+        self.assertEqual(list(game.moves), [e2e4, d7d5, e4d5])
+        self.assertEqual(game.moves_count, 3)
+        self.assertEqual([str(piece) for piece in game.captures], ["P"])
+        self.assertEqual(game.winner, "White")
+        self.assertEqual(Game.objects.get(pk="second").moves_count, 1)
+        self.assertIsNone(Game.objects.get(pk="second").winner)
+        self.assertEqual(find_games(1), (2, [("first", 1), ("second", 1)]))
+        self.assertEqual(find_games((1 << 64) - 1), (1, [("first", 3)]))
+
+        # Back to the start, eg. after Nf3 Nf6 Ng1 Ng8
+        write_moves([("second", d7d5, 0, START_KEY, None)])
+        self.assertEqual(
+            find_games(START_KEY),
+            (3, [("first", 0), ("second", 0), ("second", 2)]),
+        )
+
+
+class MoveWriterTestCase(TestCase):
+    def setUp(self):
+        self.e2e4 = encode_move(SQUARES["e2"], SQUARES["e4"])
+        self.d7d5 = encode_move(SQUARES["d7"], SQUARES["d5"])
+
+    async def test_batches(self):
+        writer = MoveWriter(flush_ms=60000, batch_size=2, max_pending=100)
+        with mock.patch("apps.game.persistence.write_moves") as write:
+            await writer.add("batched", self.e2e4, 0, 1)
+            await asyncio.sleep(0.01)
+            write.assert_not_called()
+            # A full batch wakes the writer up
+            await writer.add("batched", self.d7d5, 0, 2)
+            await asyncio.sleep(0.01)
+            write.assert_called_once_with(
+                [("batched", self.e2e4, 0, 1, None), ("batched", self.d7d5, 0, 2, None)]
+            )
+            await writer.close()
+        self.assertEqual(writer.pending, [])
+
+    def test_flush_after_a_failure(self):
+        writer = MoveWriter(flush_ms=60000, batch_size=100, max_pending=100)
+        writer.pending = [("failed", self.e2e4, 0, 1, None)]
+        with mock.patch(
+            "apps.game.persistence.write_moves", side_effect=[ValueError, None]
+        ):
+            self.assertRaises(ValueError, writer.flush)
+            self.assertEqual(len(writer.pending), 1)
+            self.assertEqual(writer.flush(), 1)
+        self.assertEqual(writer.pending, [])
+
+    def test_outage_never_drops_moves(self):
+        writer = MoveWriter(flush_ms=60000, batch_size=100, max_pending=100, retries=1)
+        writer.pending = [("down", self.e2e4, 0, 1, None)]
+        with mock.patch(
+            "apps.game.persistence.write_moves", side_effect=OperationalError
+        ):
+            for _ in range(5):
+                self.assertRaises(OperationalError, writer.flush)
+        writer.pending.append(("down", self.d7d5, 0, 2, None))
+        self.assertEqual((len(writer.pending), writer.dropped), (2, 0))
+        self.assertEqual(writer.flush(), 2)
+        self.assertEqual(
+            list(Game.objects.get(pk="down").moves), [self.e2e4, self.d7d5]
+        )
+
+    def test_refused_game_is_dropped(self):
+        writer = MoveWriter(flush_ms=60000, batch_size=100, max_pending=100, retries=2)
+        writer.pending = [
+            ("bad", self.e2e4, 0, 1, None),
+            ("good", self.e2e4, 0, 1, None),
+        ]
+
+        def write(batch):
+            if any(game_id == "bad" for game_id, *_ in batch):
+                raise IntegrityError("bad row")
+            write_moves(batch)
+
+        with mock.patch("apps.game.persistence.write_moves", side_effect=write):
+            self.assertEqual(writer.flush(), 1)
+            self.assertEqual(len(writer.pending), 1)  # retried once more
+            writer.pending.append(("bad", self.d7d5, 0, 2, None))
+            self.assertEqual(writer.flush(), 0)
+        self.assertEqual((writer.pending, writer.dropped), ([], 2))
+        self.assertEqual(writer.broken, {"bad"})
+
+        # The moves after the dropped ones would leave a gap
+        writer.pending.append(("bad", self.e2e4, 0, 3, None))
+        self.assertEqual(writer.flush(), 0)
+        self.assertEqual(writer.dropped, 3)
+        self.assertEqual(Game.objects.get(pk="good").moves_count, 1)
+        self.assertFalse(Game.objects.filter(pk="bad").exists())
+
+    async def test_backpressure(self):
+        writer = MoveWriter(flush_ms=1, batch_size=100, max_pending=2)
+        with mock.patch("apps.game.persistence.write_moves") as write:
+            for key in range(3):
+                await writer.add("busy", self.e2e4, 0, key)
+            # The third move waited for the first two to be written
+            self.assertEqual(len(write.call_args.args[0]), 2)
+            self.assertEqual(len(writer.pending), 1)
+            writer.task.cancel()
+
+            # While writes fail the player waits, no move is lost
+            write.side_effect = [OperationalError, OperationalError, None]
+            await writer.add("busy", self.e2e4, 0, 3)
+            with self.assertLogs("apps.game.persistence", "ERROR"):
+                await writer.add("busy", self.e2e4, 0, 4)
+            self.assertEqual(len(write.call_args.args[0]), 2)
+            self.assertEqual((len(writer.pending), writer.dropped), (1, 0))
+            writer.task.cancel()
+
+
+class BotPoolTestCase(SimpleTestCase):
+    def setUp(self):
+        self.pool = BotPool(workers=1, max_queue=1, timeout_ms=50)
+        # Threads stand in for the worker processes
+        self.executor = ThreadPoolExecutor(1)
+        self.pool.get_executor = lambda: self.executor
+        self.release = threading.Event()
+        self.addCleanup(self.executor.shutdown)
+        self.addCleanup(self.release.set)
+
+    def slow_search(self, board, time_ms):
+        self.release.wait(1)
+
+    async def test_timeout(self):
+        with mock.patch("apps.game.bots.find_move", self.slow_search):
+            with self.assertRaises(asyncio.TimeoutError):
+                await self.pool.request(ChessBoard(), 0)
+        metrics = self.pool.metrics()
+        self.assertEqual((metrics["timed_out"], metrics["pending"]), (1, 0))
+
+    async def test_busy(self):
+        with mock.patch("apps.game.bots.find_move", self.slow_search):
+            waiting = asyncio.create_task(self.pool.request(ChessBoard(), 1000))
+            await asyncio.sleep(0.01)
+            with self.assertRaises(BotBusy):
+                await self.pool.request(ChessBoard(), 1000)
+            self.release.set()
+            await waiting
+        metrics = self.pool.metrics()
+        self.assertEqual((metrics["submitted"], metrics["completed"]), (1, 1))
+
+    def test_status(self):
+        response = self.client.get("/status/").json()
+        self.assertEqual(response["bots"]["pending"], 0)
+        self.assertIn("hits", response["move_cache"])
+
+
+async def join(game_id):
+    """
+    A client connected to `game_id`, past its `game_id` and snapshot frames
+    """
+    communicator = WebsocketCommunicator(
+        URLRouter(websocket_urlpatterns), f"/ws/play/{game_id}/"
+    )
+    connected, _ = await communicator.connect()
+    assert connected
+    await communicator.receive_json_from()
+    await communicator.receive_json_from()
+    return communicator
+
+
+class ConsumerTestCase(TestCase):
+    async def test_moves_stay_in_their_game(self):
+        first, second = await join("one"), await join("one")
+        other = await join("two")
+        await first.send_json_to(
+            {"message": {"type": "move", "from": ["e", "2"], "to": ["e", "4"]}}
+        )
+        for client in first, second:
+            response = await client.receive_json_from()
+            self.assertEqual((response["seq"], response["to"]), (1, "e4"))
+        self.assertTrue(await other.receive_nothing(0.1))
+
+        # The other game is still at the start
+        await other.send_json_to(
+            {"message": {"type": "move", "from": ["e", "2"], "to": ["e", "3"]}}
+        )
+        self.assertEqual((await other.receive_json_from())["seq"], 1)
+        self.assertTrue(await first.receive_nothing(0.1))
+        for client in first, second, other:
+            await client.disconnect()
+        await move_writer.close()
+
+    async def test_resync(self):
+        client = await join("resync")
+        for start, end in (["e", "2"], ["e", "4"]), (["e", "7"], ["e", "5"]):
+            await client.send_json_to(
+                {"message": {"type": "move", "from": start, "to": end}}
+            )
+            await client.receive_json_from()
+
+        # Reconnecting after the first move gets the second one
+        late = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns), "/ws/play/resync/?seq=1"
+        )
+        await late.connect()
+        await late.receive_json_from()  # game_id
+        response = await late.receive_json_from()
+        self.assertEqual(response["type"], "moves")
+        self.assertEqual([event["to"] for event in response["events"]], ["e5"])
+
+        # A client ahead of the game gets the whole position again
+        await late.send_json_to({"message": {"type": "resync", "seq": 9}})
+        response = await late.receive_json_from()
+        self.assertEqual((response["type"], response["seq"]), ("snapshot", 2))
+        self.assertEqual(response["squares"][SQUARES["e5"]], "bP")
+        self.assertEqual(response["side_to_move"], "w")
+        for communicator in client, late:
+            await communicator.disconnect()
+        await move_writer.close()
+
+    async def test_rejoin_with_moves_still_queued(self):
+        e2e4 = encode_move(SQUARES["e2"], SQUARES["e4"])
+        e7e5 = encode_move(SQUARES["e7"], SQUARES["e5"])
+        await database_sync_to_async(write_moves)([("queued", e2e4, 0, 1, None)])
+        move_writer.pending.append(("queued", e7e5, 0, 2, None))
+        self.addCleanup(move_writer.pending.clear)
+
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns), "/ws/play/queued/"
+        )
+        await communicator.connect()
+        await communicator.receive_json_from()  # game_id
+        snapshot = await communicator.receive_json_from()
+        self.assertEqual(snapshot["seq"], 2)
+        self.assertEqual(snapshot["squares"][SQUARES["e5"]], "bP")
+        await communicator.disconnect()
+
+    async def test_stale_bot_move_is_not_played(self):
+        client = await join("stale")
+        live = registry.games["stale"]
+        bot_move = {
+            "type": "bot_move",
+            "key": live.engine.zobrist_key,
+            "move": encode_move(SQUARES["g1"], SQUARES["f3"]),
+        }
+        # The bot's move arrives while other moves are being played
+        async with live.lock:
+            await get_channel_layer().group_send(live.group_name, bot_move)
+            await asyncio.sleep(0.01)
+            live.engine.make_move([6, 4], [5, 4])
+            live.engine.make_move([1, 4], [2, 4])
+        self.assertTrue(await client.receive_nothing(0.1))
+        self.assertEqual(len(live.engine.moves_history), 2)
+        await client.disconnect()
+
+    async def test_targets_wait_for_the_move_in_play(self):
+        client = await join("locked")
+        # As if a move were being played in a worker thread
+        async with registry.games["locked"].lock:
+            await client.send_json_to({"message": {"type": "targets", "square": "e2"}})
+            self.assertTrue(await client.receive_nothing(0.1))
+        response = await client.receive_json_from()
+        self.assertEqual(sorted(response["targets"]), ["e3", "e4"])
+
+        for square in "e9", None, ["e", "2"]:
+            message = {"type": "targets", "square": square}
+            await client.send_json_to({"message": message})
+            response = await client.receive_json_from()
+            self.assertEqual(response["type"], "error")
+        await client.disconnect()
+
+    async def test_promotion_letter(self):
+        client = await join("promotion")
+        move = {"type": "move", "from": ["e", "2"], "to": ["e", "4"]}
+        await client.send_json_to({"message": {**move, "promotion": "K"}})
+        response = await client.receive_json_from()
+        self.assertEqual(response, {"type": "error", "message": "Can't promote to K"})
+
+        # A missing letter is a queen
+        await client.send_json_to({"message": {**move, "promotion": None}})
+        response = await client.receive_json_from()
+        self.assertEqual((response["type"], response["to"]), ("move", "e4"))
+        await client.disconnect()
+        await move_writer.close()
+
+    async def test_bot_request_is_cancelled_on_leave(self):
+        searching = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def request(board, time_ms):
+            searching.set()
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        client = await join("bot")
+        with mock.patch("apps.game.consumers.bot_pool.request", request):
+            await client.send_json_to({"message": {"type": "bot"}})
+            await asyncio.wait_for(searching.wait(), 1)
+            await client.send_json_to({"message": {"type": "bot"}})
+            response = await client.receive_json_from()
+            self.assertEqual(response["message"], "The computer is already thinking")
+            await client.disconnect()
+        await asyncio.wait_for(cancelled.wait(), 1)
@@ -1,6 +1,16 @@
 from django.urls import path
 from django.views.generic import TemplateView
 
+from apps.game import views
+
 urlpatterns = [
-    path("", TemplateView.as_view(template_name="game/index.html"), name="index")
+    path("", TemplateView.as_view(template_name="game/index.html"), name="index"),
+    path(
+        "games/<str:game_id>/position/",
+        views.game_position,
+        name="game-position",
+    ),
+    path("positions/", views.position_games, name="position-games"),
+    path("book/", views.book_moves, name="book-moves"),
+    path("status/", views.status, name="status"),
 ]
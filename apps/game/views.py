@@ -0,0 +1,123 @@
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+
+from apps.game.bots import bot_pool
+from apps.game.models import Game
+from apps.game.positions import find_games
+from apps.game.registry import board_state, registry
+from apps.game.replay import replays
+from chess.bitboards import legal_moves
+from chess.book import get_book
+from chess.cache import move_cache
+from chess.constants import SQUARE_NAMES
+from chess.engine import ChessBoard
+from chess.fen import load_fen
+from chess.moves import decode_move
+from chess.pgn import san
+
+
+def game_position(request, game_id):
+    """
+    The position of a stored game after `?ply=<n>` moves, the last position
+    when no ply is given. Lets spectators scrub through a game.
+    """
+    game = get_object_or_404(Game.objects.only("move_list"), pk=game_id)
+    replay = replays.get(game)
+
+    ply = request.GET.get("ply", str(replay.plies))
+    if not ply.isdigit() or int(ply) > replay.plies:
+        return JsonResponse(
+            {"error": f"ply must be between 0 and {replay.plies}"}, status=400
+        )
+    ply = int(ply)
+
+    last_move = None
+    if ply:
+        start, end, _ = decode_move(replay.moves[ply - 1])
+        last_move = SQUARE_NAMES[start] + SQUARE_NAMES[end]
+
+    return JsonResponse(
+        {
+            "game_id": game_id,
+            "ply": ply,
+            "plies": replay.plies,
+            "last_move": last_move,
+            **board_state(replay.position_at(ply)),
+        }
+    )
+
+
+def position_games(request):
+    """
+    The stored games that reached a position, given as `?fen=<fen>` or as
+    its Zobrist key in hex, `?key=<key>`. At most `?limit=<n>` games are
+    listed, 100 by default.
+    """
+    try:
+        if "fen" in request.GET:
+            key = load_fen(request.GET["fen"]).key
+        else:
+            key = int(request.GET.get("key", ""), 16)
+            if not 0 <= key < 1 << 64:
+                raise ValueError(key)
+        limit = max(1, min(int(request.GET.get("limit", 100)), 1000))
+    except ValueError:
+        return JsonResponse(
+            {"error": "Give the position as fen=<fen> or key=<hex key>"}, status=400
+        )
+
+    count, games = find_games(key, limit)
+    return JsonResponse(
+        {
+            "key": f"{key:016x}",
+            "count": count,
+            "games": [{"game_id": game_id, "ply": ply} for game_id, ply in games],
+        }
+    )
+
+
+def book_moves(request):
+    """
+    The opening book moves of a position, `?fen=<fen>`, the start position
+    by default, most played first with how the games went
+    """
+    book = get_book()
+    if book is None:
+        return JsonResponse({"error": "No opening book was built"}, status=404)
+    try:
+        board = load_fen(request.GET["fen"]) if "fen" in request.GET else ChessBoard()
+    except ValueError as error:
+        return JsonResponse({"error": str(error)}, status=400)
+
+    legal = legal_moves(board)
+    moves = []
+    for entry in book.lookup(board.key):
+        # A key collision with a position of another game
+        if entry.move not in legal:
+            continue
+        start, end, _ = decode_move(entry.move)
+        moves.append(
+            {
+                "move": SQUARE_NAMES[start] + SQUARE_NAMES[end],
+                "san": san(board, entry.move, legal),
+                "games": entry.white + entry.draws + entry.black,
+                "white": entry.white,
+                "draws": entry.draws,
+                "black": entry.black,
+            }
+        )
+    return JsonResponse({"key": f"{board.key:016x}", "moves": moves})
+
+
+def status(request):
+    """
+    Counters of this worker process, for monitoring: the bot pool's queue
+    and requests, the legal move cache and the games being played
+    """
+    return JsonResponse(
+        {
+            "bots": bot_pool.metrics(),
+            "move_cache": move_cache.info(),
+            "live_games": len(registry.games),
+        }
+    )
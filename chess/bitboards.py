@@ -0,0 +1,343 @@
+"""
+  Bitboard move generation.
+
+  A bitboard is a python `int` used as a 64 bit set, bit `n` standing for
+  square `n` of the board (a8 is bit 0, h1 is bit 63, as in `ChessBoard`).
+
+  Knight, king and pawn attacks are precomputed per square. Sliding pieces use
+  kindergarten style line lookups: the occupancy of a rank, file or diagonal
+  (without its edge squares) indexes a table of attacks for that line.
+  Python ints hash to themselves, so a `dict` keyed by the masked occupancy
+  does the job of the magic multiplication used by C engines.
+"""
+from chess.constants import (
+    BISHOP_CODE,
+    BLACK_KINGSIDE,
+    BLACK_PIECE,
+    BLACK_QUEENSIDE,
+    KING_CODE,
+    KNIGHT_CODE,
+    PAWN_CODE,
+    QUEEN_CODE,
+    ROOK_CODE,
+    SQUARES,
+    WHITE_KINGSIDE,
+    WHITE_QUEENSIDE,
+)
+
+FULL = (1 << 64) - 1
+
+FILE_A = sum(1 << (row * 8) for row in range(8))
+FILE_H = FILE_A << 7
+ROW_3 = 0xFF << 40  # white pawns land here after a single step from row 6
+ROW_6 = 0xFF << 16  # black pawns land here after a single step from row 1
+ROW_0 = 0xFF  # white pawns promote here
+ROW_7 = 0xFF << 56  # black pawns promote here
+
+# Pieces a pawn can promote to, most valuable first
+PROMOTIONS = (QUEEN_CODE, ROOK_CODE, BISHOP_CODE, KNIGHT_CODE)
+
+
+def _castle(right, king_start, king_end, rook_start, rook_end):
+    """
+    `(right, king start, king end, rook start, rook end, squares that must
+    be empty, squares the king can't be attacked on)` of one castling move
+    """
+    king_start, king_end = SQUARES[king_start], SQUARES[king_end]
+    rook_start, rook_end = SQUARES[rook_start], SQUARES[rook_end]
+    low, high = sorted((king_start, rook_start))
+    between = sum(1 << square for square in range(low + 1, high))
+    step = 1 if king_end > king_start else -1
+    passed = range(king_start, king_end + step, step)
+    return right, king_start, king_end, rook_start, rook_end, between, passed
+
+
+# The castling moves of each side, the king moving two squares
+CASTLES = (
+    (
+        _castle(WHITE_KINGSIDE, "e1", "g1", "h1", "f1"),
+        _castle(WHITE_QUEENSIDE, "e1", "c1", "a1", "d1"),
+    ),
+    (
+        _castle(BLACK_KINGSIDE, "e8", "g8", "h8", "f8"),
+        _castle(BLACK_QUEENSIDE, "e8", "c8", "a8", "d8"),
+    ),
+)
+# King end square -> the `(start, end)` of the rook castling with it
+CASTLING_ROOKS = {
+    castle[2]: (castle[3], castle[4]) for side in CASTLES for castle in side
+}
+
+
+def _on_board(row, column) -> bool:
+    return 0 <= row < 8 and 0 <= column < 8
+
+
+def _leaper_attacks(steps):
+    """
+    Attack sets of a piece that jumps by fixed `(row, column)` steps
+    """
+    attacks = []
+    for square in range(64):
+        row, column = divmod(square, 8)
+        bitboard = 0
+        for row_step, column_step in steps:
+            if _on_board(row + row_step, column + column_step):
+                bitboard |= 1 << ((row + row_step) * 8 + column + column_step)
+        attacks.append(bitboard)
+    return attacks
+
+
+KNIGHT_ATTACKS = _leaper_attacks(
+    [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)]
+)
+KING_ATTACKS = _leaper_attacks(
+    [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+)
+
+# Squares attacked by a pawn standing on a square, white pawns move up (row - 1)
+PAWN_ATTACKS = (
+    _leaper_attacks([(-1, -1), (-1, 1)]),
+    _leaper_attacks([(1, -1), (1, 1)]),
+)
+
+
+def _line_table(square, directions):
+    """
+    Builds the `(mask, attacks)` lookup of one line through `square`.
+
+    `mask` holds the squares of the line whose occupancy matters (the edges
+    never block anything further), `attacks` maps every occupancy of `mask`
+    to the squares reached along the line, first blocker included.
+    """
+    row, column = divmod(square, 8)
+    rays = []
+    for row_step, column_step in directions:
+        ray = []
+        next_row, next_column = row + row_step, column + column_step
+        while _on_board(next_row, next_column):
+            ray.append(next_row * 8 + next_column)
+            next_row, next_column = next_row + row_step, next_column + column_step
+        rays.append(ray)
+
+    inner = [target for ray in rays for target in ray[:-1]]
+    mask = sum(1 << target for target in inner)
+
+    attacks = {}
+    for index in range(1 << len(inner)):
+        occupancy = sum(
+            1 << target for bit, target in enumerate(inner) if index >> bit & 1
+        )
+        bitboard = 0
+        for ray in rays:
+            for target in ray:
+                bitboard |= 1 << target
+                if occupancy >> target & 1:
+                    break
+        attacks[occupancy] = bitboard
+    return mask, attacks
+
+
+ROOK_LINES = [
+    (_line_table(square, [(0, -1), (0, 1)]), _line_table(square, [(-1, 0), (1, 0)]))
+    for square in range(64)
+]
+BISHOP_LINES = [
+    (
+        _line_table(square, [(-1, -1), (1, 1)]),
+        _line_table(square, [(-1, 1), (1, -1)]),
+    )
+    for square in range(64)
+]
+
+# Every square a queen on the square could ever reach, used to spot pins
+QUEEN_RAYS = [
+    ROOK_LINES[square][0][1][0]
+    | ROOK_LINES[square][1][1][0]
+    | BISHOP_LINES[square][0][1][0]
+    | BISHOP_LINES[square][1][1][0]
+    for square in range(64)
+]
+
+
+def rook_attacks(square, occupied) -> int:
+    (rank_mask, rank), (file_mask, file) = ROOK_LINES[square]
+    return rank[occupied & rank_mask] | file[occupied & file_mask]
+
+
+def bishop_attacks(square, occupied) -> int:
+    (diagonal_mask, diagonal), (anti_mask, anti) = BISHOP_LINES[square]
+    return diagonal[occupied & diagonal_mask] | anti[occupied & anti_mask]
+
+
+def squares_of(bitboard):
+    """
+    Yields the square of every set bit, lowest first
+    """
+    while bitboard:
+        lowest = bitboard & -bitboard
+        yield lowest.bit_length() - 1
+        bitboard ^= lowest
+
+
+def attackers(board, square, white, occupied, removed=0) -> int:
+    """
+    Returns the pieces of the `white` side attacking `square`, given the
+    `occupied` squares. Pieces on the `removed` squares, eg. one about to be
+    captured, are left out without touching the board.
+    """
+    pieces = board.bitboards
+    side = 0 if white else BLACK_PIECE
+    queens = pieces[QUEEN_CODE | side]
+    return (
+        (KNIGHT_ATTACKS[square] & pieces[KNIGHT_CODE | side])
+        | (KING_ATTACKS[square] & pieces[KING_CODE | side])
+        | (PAWN_ATTACKS[1 if white else 0][square] & pieces[PAWN_CODE | side])
+        | (bishop_attacks(square, occupied) & (pieces[BISHOP_CODE | side] | queens))
+        | (rook_attacks(square, occupied) & (pieces[ROOK_CODE | side] | queens))
+    ) & ~removed
+
+
+def is_attacked(board, square, white) -> bool:
+    """
+    Checks whether the `white` side attacks `square`
+    """
+    return attackers(board, square, white, board.colors[0] | board.colors[1]) != 0
+
+
+def pseudo_legal_moves(board):
+    """
+    Generates every move of the side to play, ignoring whether it leaves its
+    own king in check. Moves are encoded as in `chess.moves.encode_move`.
+
+    Special moves come from the board's compact state: en passant from its
+    `en_passant` square, castling from its `castling` bitmask. Castling is
+    only generated when the king isn't in check and doesn't pass through an
+    attacked square, so it is fully checked here.
+    """
+    white = board.white_to_play
+    side = 0 if white else BLACK_PIECE
+    pieces = board.bitboards
+    own = board.colors[0 if white else 1]
+    enemy = board.colors[1 if white else 0]
+    occupied = own | enemy
+    empty = ~occupied & FULL
+    targets = ~own & FULL
+    moves = []
+    append = moves.append
+
+    # Pawns
+    pawns = pieces[PAWN_CODE | side]
+    if white:
+        single = (pawns >> 8) & empty
+        double = ((single & ROW_3) >> 8) & empty
+        left = ((pawns & ~FILE_A) >> 9) & enemy
+        right = ((pawns & ~FILE_H) >> 7) & enemy
+        single_step, left_step, right_step = 8, 9, 7
+    else:
+        single = (pawns << 8) & empty
+        double = ((single & ROW_6) << 8) & empty
+        left = ((pawns & ~FILE_A) << 7) & enemy
+        right = ((pawns & ~FILE_H) << 9) & enemy
+        single_step, left_step, right_step = -8, -7, -9
+
+    last_row = ROW_0 if white else ROW_7
+    for target in squares_of(double):
+        append(target + 2 * single_step | target << 6)
+    for pawn_targets, step in (
+        (single, single_step),
+        (left, left_step),
+        (right, right_step),
+    ):
+        for target in squares_of(pawn_targets & ~last_row):
+            append(target + step | target << 6)
+        for target in squares_of(pawn_targets & last_row):
+            for promotion in PROMOTIONS:
+                append(target + step | target << 6 | promotion << 12)
+
+    # En passant, by the pawns attacking the square the enemy pawn skipped
+    if board.en_passant >= 0:
+        passed = board.en_passant
+        for start in squares_of(PAWN_ATTACKS[1 if white else 0][passed] & pawns):
+            append(start | passed << 6)
+
+    # Knights and the king
+    for code, table in ((KNIGHT_CODE, KNIGHT_ATTACKS), (KING_CODE, KING_ATTACKS)):
+        for start in squares_of(pieces[code | side]):
+            for target in squares_of(table[start] & targets):
+                append(start | target << 6)
+
+    # Sliding pieces
+    queens = pieces[QUEEN_CODE | side]
+    for start in squares_of(pieces[BISHOP_CODE | side] | queens):
+        for target in squares_of(bishop_attacks(start, occupied) & targets):
+            append(start | target << 6)
+    for start in squares_of(pieces[ROOK_CODE | side] | queens):
+        for target in squares_of(rook_attacks(start, occupied) & targets):
+            append(start | target << 6)
+
+    # Castling, the king moving two squares towards the rook
+    if board.castling:
+        rooks = pieces[ROOK_CODE | side]
+        king = pieces[KING_CODE | side]
+        for right, king_start, king_end, rook_start, _, between, passed in CASTLES[
+            0 if white else 1
+        ]:
+            if (
+                board.castling & right
+                and king >> king_start & 1
+                and rooks >> rook_start & 1
+                and not occupied & between
+                and not any(
+                    attackers(board, square, not white, occupied) for square in passed
+                )
+            ):
+                append(king_start | king_end << 6)
+
+    return moves
+
+
+def legal_moves(board):
+    """
+    Generates the moves of the side to play that don't leave its king in check.
+
+    Only moves that could expose the king are tested: king moves, moves out of
+    a square on a line with the king, and every move while in check.
+    """
+    white = board.white_to_play
+    side = 0 if white else BLACK_PIECE
+    king = board.bitboards[KING_CODE | side]
+    if not king:
+        return pseudo_legal_moves(board)
+
+    king_square = king.bit_length() - 1
+    occupied = board.colors[0] | board.colors[1]
+    in_check = attackers(board, king_square, not white, occupied) != 0
+    exposed = QUEEN_RAYS[king_square]
+    squares = board.squares
+
+    en_passant = board.en_passant
+    pawn = PAWN_CODE | side
+    moves = []
+    for move in pseudo_legal_moves(board):
+        start = move & 63
+        end = move >> 6 & 63
+        # En passant takes a pawn off another line, it is always tested
+        passant = end == en_passant and squares[start] == pawn
+        if not (in_check or passant or start == king_square or exposed >> start & 1):
+            moves.append(move)
+            continue
+
+        start_bit, end_bit = 1 << start, 1 << end
+        square = end if start == king_square else king_square
+        captured_square = end
+        if passant:
+            captured_square = end + 8 if white else end - 8
+        captured_bit = 1 << captured_square
+        after = (occupied ^ start_bit ^ (captured_bit if passant else 0)) | end_bit
+
+        # The captured piece is masked out rather than taken off the board,
+        # which other threads may be reading
+        if not attackers(board, square, not white, after, captured_bit):
+            moves.append(move)
+    return moves
@@ -0,0 +1,161 @@
+"""
+  The opening book: what was played from a position, and how it went.
+
+  The book is built offline into one file of fixed size records sorted by
+  Zobrist key, then move:
+
+  `key (8 bytes), move (2 bytes), white wins, draws, black wins (4 bytes each)`
+
+  after an 8 byte header. The file is memory mapped, not read: processes
+  share its pages and a lookup is a binary search over the records, so it
+  costs O(log n) record reads whatever the size of the book.
+"""
+import mmap
+import os
+import random
+import struct
+from collections import namedtuple
+
+from chess.bitboards import legal_moves
+from chess.engine import ChessBoard
+from chess.services import get_setting
+
+MAGIC = b"CHBK"
+VERSION = 1
+HEADER = struct.Struct(">4sI")
+RECORD = struct.Struct(">QHIII")
+
+WHITE_WINS = 0
+DRAW = 1
+BLACK_WINS = 2
+
+BookMove = namedtuple("BookMove", "move white draws black")
+
+
+class OpeningBook:
+    """
+    `path: str`: A book file written by `write_book()`
+
+    `lookup(key)`: The `BookMove`s of a position, most played first
+
+    `choose(key)`: A move for the position, picked at random weighted by how
+    often it was played, or `None` when the position isn't in the book
+    """
+
+    def __init__(self, path) -> None:
+        with open(path, "rb") as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.data) < HEADER.size:
+            raise ValueError(f"{path} is not an opening book")
+        magic, version = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not an opening book")
+        self.size = (len(self.data) - HEADER.size) // RECORD.size
+
+    def __len__(self) -> int:
+        return self.size
+
+    def key_at(self, index) -> int:
+        return struct.unpack_from(">Q", self.data, HEADER.size + index * RECORD.size)[0]
+
+    def lookup(self, key):
+        # The first record of the key
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self.key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        moves = []
+        offset = HEADER.size + low * RECORD.size
+        while low < self.size:
+            record_key, *counts = RECORD.unpack_from(self.data, offset)
+            if record_key != key:
+                break
+            moves.append(BookMove(*counts))
+            low += 1
+            offset += RECORD.size
+        moves.sort(key=lambda entry: -(entry.white + entry.draws + entry.black))
+        return moves
+
+    def choose(self, key, randomness=random):
+        moves = self.lookup(key)
+        if not moves:
+            return None
+        weights = [entry.white + entry.draws + entry.black for entry in moves]
+        return randomness.choices(moves, weights)[0].move
+
+    def close(self) -> None:
+        self.data.close()
+
+
+def count_moves(games, max_ply=20):
+    """
+    Tallies `(moves, result)` games into `{(key, move): [white, draws,
+    black]}` for their first `max_ply` moves. `result` is one of
+    `WHITE_WINS`, `DRAW`, `BLACK_WINS`.
+    """
+    counts = {}
+    for moves, result in games:
+        board = ChessBoard()
+        for move in moves[:max_ply]:
+            tally = counts.get((board.key, move))
+            if tally is None:
+                tally = counts[(board.key, move)] = [0, 0, 0]
+            tally[result] += 1
+            board.play(move)
+    return counts
+
+
+def write_book(counts, path, min_games=1) -> int:
+    """
+    Writes tallies from `count_moves()` as a book file, leaving out moves
+    played fewer than `min_games` times. Returns the number of records.
+    """
+    records = sorted(
+        (key, move, *tally)
+        for (key, move), tally in counts.items()
+        if sum(tally) >= min_games
+    )
+    # Written aside and moved in place: processes mapping the old file keep
+    # reading it until they open the new one
+    partial = f"{path}.partial"
+    with open(partial, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION))
+        for record in records:
+            file.write(RECORD.pack(*record))
+    os.replace(partial, path)
+    return len(records)
+
+
+_book = None
+
+
+def get_book():
+    """
+    The book at `CHESS_BOOK_PATH`, opened once per process, or `None` when
+    no book was built
+    """
+    global _book
+    if _book is None:
+        path = get_setting("CHESS_BOOK_PATH", "")
+        if not path or not os.path.exists(path):
+            return None
+        _book = OpeningBook(path)
+    return _book
+
+
+def book_move(board):
+    """
+    A legal book move for `board`, `None` out of the book or without one.
+    The legality check guards against Zobrist key collisions.
+    """
+    book = get_book()
+    if book is None:
+        return None
+    move = book.choose(board.key)
+    if move is None or move not in legal_moves(board):
+        return None
+    return move
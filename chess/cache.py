@@ -0,0 +1,69 @@
+"""
+  Process-wide cache of legal moves, keyed by the Zobrist hash of a position.
+
+  Openings and popular lines recur across many games, and clients keep asking
+  where a selected piece may go, so the legal move list of a position is
+  generated once and shared. Move lists are stored as `array("H")`, two bytes
+  per move, and the least recently used position is evicted when full.
+"""
+import threading
+from array import array
+from collections import OrderedDict
+
+from chess.bitboards import legal_moves
+from chess.services import get_setting
+
+
+class LegalMoveCache:
+    """
+    An LRU cache of legal move lists
+    ---
+
+    `maxsize: int`: Most positions kept
+
+    `hits`, `misses`: Lookup counters, see `info()`
+    """
+
+    def __init__(self, maxsize) -> None:
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, board):
+        """
+        Returns the legal moves of `board`, generating them on a miss
+        """
+        key = board.key
+        with self.lock:
+            moves = self.entries.get(key)
+            if moves is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return moves
+            self.misses += 1
+
+        moves = array("H", legal_moves(board))
+        with self.lock:
+            self.entries[key] = moves
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return moves
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+    def info(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+            }
+
+
+move_cache = LegalMoveCache(get_setting("CHESS_MOVE_CACHE_SIZE", 50000))
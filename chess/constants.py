@@ -55,3 +55,65 @@ BLOCKED_MOVE = "Move is blocked!"
 NO_PIECE_MOVED = "No piece Moved!"
 PIECE_RESTRAINED = "Opponent's piece!"
 PATH_BLOCKED = "There is a piece blocking the path"
+GAME_OVER = "The game is over!"
+CHECK = "Check!"
+
+# Game results, as stored in `Game.winner`
+WHITE_WON = "White"
+BLACK_WON = "Black"
+DRAWN = "Draw"
+
+# Why a game ended
+CHECKMATE = "checkmate"
+STALEMATE = "stalemate"
+REPETITION = "threefold repetition"
+FIFTY_MOVES = "fifty-move rule"
+INSUFFICIENT_MATERIAL = "insufficient material"
+
+
+"""
+  Piece codes for the compact board.
+  The low three bits hold the piece type and `BLACK_PIECE` is OR'ed in
+  for black pieces, so every square fits in a single byte.
+"""
+EMPTY = 0
+PAWN_CODE = 1
+KNIGHT_CODE = 2
+BISHOP_CODE = 3
+ROOK_CODE = 4
+QUEEN_CODE = 5
+KING_CODE = 6
+
+BLACK_PIECE = 8
+PIECE_TYPE = 7  # mask for the piece type
+
+PIECE_CODES = {
+    PAWN: PAWN_CODE,
+    KNIGHT: KNIGHT_CODE,
+    BISHOP: BISHOP_CODE,
+    ROOK: ROOK_CODE,
+    QUEEN: QUEEN_CODE,
+    KING: KING_CODE,
+}
+CODES_TO_PIECES = {value: key for key, value in PIECE_CODES.items()}
+
+
+# Castling rights, kept as a bitmask on the board
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+ALL_CASTLING = WHITE_KINGSIDE | WHITE_QUEENSIDE | BLACK_KINGSIDE | BLACK_QUEENSIDE
+
+NO_SQUARE = -1  # No en passant square available
+
+
+# Squares are numbered `row * 8 + column`, so a8 is 0 and h1 is 63
+SQUARE_NAMES = [
+    COLUMNS_TO_FILES[square % 8] + ROWS_TO_RANKS[square // 8] for square in range(64)
+]
+SQUARES = {name: square for square, name in enumerate(SQUARE_NAMES)}
+
+
+# Piece values in centipawns, indexed by piece type
+PIECE_VALUES = (0, 100, 320, 330, 500, 900, 0, 0)
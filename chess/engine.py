@@ -1,18 +1,118 @@
-from chess.constants import BLACK, NO_PIECE_MOVED, PATH_BLOCKED, PIECE_RESTRAINED, WHITE
-from chess.pieces import Bishop, King, Knight, Pawn, Queen, Rook
+from collections import Counter, namedtuple
+
+from chess.bitboards import CASTLING_ROOKS, PAWN_ATTACKS
+from chess.cache import move_cache
+from chess.constants import (
+    ALL_CASTLING,
+    BISHOP_CODE,
+    BLACK,
+    BLACK_KINGSIDE,
+    BLACK_PIECE,
+    BLACK_QUEENSIDE,
+    BLACK_WON,
+    CHECK,
+    CHECKMATE,
+    DRAWN,
+    EMPTY,
+    FIFTY_MOVES,
+    GAME_OVER,
+    ILLEGAL_MOVE,
+    INSUFFICIENT_MATERIAL,
+    KING_CODE,
+    KNIGHT_CODE,
+    NO_PIECE_MOVED,
+    NO_SQUARE,
+    PATH_BLOCKED,
+    PAWN_CODE,
+    PIECE_RESTRAINED,
+    PIECE_TYPE,
+    QUEEN_CODE,
+    REPETITION,
+    ROOK_CODE,
+    SQUARES,
+    STALEMATE,
+    WHITE,
+    WHITE_KINGSIDE,
+    WHITE_QUEENSIDE,
+    WHITE_WON,
+)
+from chess.evaluation import evaluate, evaluate_batch
+from chess.moves import encode_move
+from chess.pieces import PIECES
+from chess.search import MAX_DEPTH, Searcher, in_check
 from chess.services import create_message
+from chess.zobrist import (
+    BLACK_TO_MOVE,
+    CASTLING_KEYS,
+    EN_PASSANT_KEYS,
+    PIECE_KEYS,
+    hash_board,
+)
+
+BACK_RANK = (
+    ROOK_CODE,
+    KNIGHT_CODE,
+    BISHOP_CODE,
+    QUEEN_CODE,
+    KING_CODE,
+    BISHOP_CODE,
+    KNIGHT_CODE,
+    ROOK_CODE,
+)
+
+# The starting position, copied into every new board
+START_SQUARES = bytes(
+    [code | BLACK_PIECE for code in BACK_RANK]
+    + [PAWN_CODE | BLACK_PIECE] * 8
+    + [EMPTY] * 32
+    + [PAWN_CODE] * 8
+    + list(BACK_RANK)
+)
+
+# Castling rights kept when a piece moves from or to each square
+CASTLING_MASKS = [ALL_CASTLING] * 64
+CASTLING_MASKS[SQUARES["a1"]] ^= WHITE_QUEENSIDE
+CASTLING_MASKS[SQUARES["h1"]] ^= WHITE_KINGSIDE
+CASTLING_MASKS[SQUARES["e1"]] ^= WHITE_KINGSIDE | WHITE_QUEENSIDE
+CASTLING_MASKS[SQUARES["a8"]] ^= BLACK_QUEENSIDE
+CASTLING_MASKS[SQUARES["h8"]] ^= BLACK_KINGSIDE
+CASTLING_MASKS[SQUARES["e8"]] ^= BLACK_KINGSIDE | BLACK_QUEENSIDE
+
+# Squares of the same color as a8
+LIGHT_SQUARES = sum(
+    1 << square for square in range(64) if (square // 8 + square % 8) % 2 == 0
+)
+
+Outcome = namedtuple("Outcome", "winner reason")
+Outcome.__doc__ = """
+    `winner: str`: `WHITE_WON`, `BLACK_WON` or `DRAWN`, as stored in
+    `Game.winner`
+
+    `reason: str`: `CHECKMATE`, `STALEMATE`, `REPETITION`, `FIFTY_MOVES` or
+    `INSUFFICIENT_MATERIAL`
+"""
 
 
 class ChessBoard:
     """
     This places the pieces on the board matrix.
-    We'll use a 2-D List to do draw the pieces on the board
+    The board is a flat `bytearray` of 64 piece codes, one byte per square,
+    numbered `row * 8 + column` (a8 is square 0, h1 is square 63).
+    Pieces are not stored as objects: a code is looked up in `PIECES` whenever
+    the behaviour of a piece is needed.
 
 
     ### THE STRUCTURE OF THE BOARD
-    `board: List[List[Piece]]`: The board object
-    `initialize()`: To load the board and place `Piece`s on it
-    `move`: A move, takes two arguments, `from_pos` and `to_pos`, each an `Iterable`
+    `squares: bytearray`: The piece code on each square, `EMPTY` if blank
+    `white_to_play: bool`: The side to move
+    `castling: int`: Castling rights bitmask, see `chess.constants`
+    `en_passant: int`: Square a pawn may capture on en passant, or `NO_SQUARE`
+    `halfmove_clock: int`: Plies since the last capture or pawn move
+    `fullmove_number: int`: Incremented after every black move
+    `bitboards: List[int]`: A bitboard of the squares holding each piece code
+    `colors: List[int]`: Bitboards of the white and the black pieces
+    `key: int`: The Zobrist hash of the position, updated on every move
+    `board: List[List[Piece]]`: The squares as a matrix of `Piece`s
 
     ``` py
           [1]       [2]      [3]     [4]      [5]      [6]      [7]      [8]
@@ -37,45 +137,204 @@ class ChessBoard:
 
     """
 
-    def __init__(self) -> None:
-        self.board = [
-            [None, None, None, None, None, None, None, None],
-            [None, None, None, None, None, None, None, None],
-            [None, None, None, None, None, None, None, None],
-            [None, None, None, None, None, None, None, None],
-            [None, None, None, None, None, None, None, None],
-            [None, None, None, None, None, None, None, None],
-            [None, None, None, None, None, None, None, None],
-            [None, None, None, None, None, None, None, None],
-        ]
+    __slots__ = (
+        "squares",
+        "white_to_play",
+        "castling",
+        "en_passant",
+        "halfmove_clock",
+        "fullmove_number",
+        "bitboards",
+        "colors",
+        "key",
+    )
+
+    def __init__(
+        self,
+        squares=START_SQUARES,
+        white_to_play=True,
+        castling=ALL_CASTLING,
+        en_passant=NO_SQUARE,
+        halfmove_clock=0,
+        fullmove_number=1,
+    ) -> None:
+        self.squares = bytearray(squares)
+        self.white_to_play = white_to_play
+        self.castling = castling
+        self.en_passant = en_passant
+        self.halfmove_clock = halfmove_clock
+        self.fullmove_number = fullmove_number
+
+        self.bitboards = [0] * 16
+        self.colors = [0, 0]
+        for square, code in enumerate(self.squares):
+            if code:
+                self.bitboards[code] |= 1 << square
+                self.colors[code >> 3] |= 1 << square
+        self.key = hash_board(self)
+
+    def copy(self):
+        """
+        Returns an independent board, cheap enough to call on every search node
+        """
+        board = ChessBoard.__new__(ChessBoard)
+        board.squares = self.squares[:]
+        board.white_to_play = self.white_to_play
+        board.castling = self.castling
+        board.en_passant = self.en_passant
+        board.halfmove_clock = self.halfmove_clock
+        board.fullmove_number = self.fullmove_number
+        board.bitboards = self.bitboards[:]
+        board.colors = self.colors[:]
+        board.key = self.key
+        return board
+
+    def code_at(self, row, column) -> int:
+        return self.squares[row * 8 + column]
+
+    def piece_at(self, row, column):
+        """
+        Returns the shared `Piece` on a square, or `None` for a blank square
+        """
+        return PIECES.get(self.squares[row * 8 + column])
+
+    def play(self, move):
+        """
+        Applies an encoded move without checking it.
+
+        Returns the undo record `(captured, castling, en_passant,
+        halfmove_clock, key)` that `undo()` needs to take the move back.
+        `captured` is the pawn taken en passant for an en passant capture.
+        """
+        start = move & 63
+        end = move >> 6 & 63
+        promotion = move >> 12
+        squares = self.squares
+        moved = squares[start]
+        piece_type = moved & PIECE_TYPE
+        captured_square = end
+        if piece_type == PAWN_CODE and end == self.en_passant:
+            captured_square = end + 8 if moved & BLACK_PIECE == 0 else end - 8
+        captured = squares[captured_square]
+        record = (
+            captured,
+            self.castling,
+            self.en_passant,
+            self.halfmove_clock,
+            self.key,
+        )
+        placed = promotion | moved & BLACK_PIECE if promotion else moved
+        start_bit = 1 << start
+        end_bit = 1 << end
+        key = (
+            self.key
+            ^ PIECE_KEYS[moved][start]
+            ^ PIECE_KEYS[placed][end]
+            ^ BLACK_TO_MOVE
+        )
+
+        if captured:
+            captured_bit = 1 << captured_square
+            self.bitboards[captured] ^= captured_bit
+            self.colors[captured >> 3] ^= captured_bit
+            key ^= PIECE_KEYS[captured][captured_square]
+            squares[captured_square] = EMPTY
+        self.bitboards[moved] ^= start_bit
+        self.bitboards[placed] ^= end_bit
+        self.colors[moved >> 3] ^= start_bit | end_bit
+        squares[end] = placed
+        squares[start] = EMPTY
+
+        # Castling moves the rook too
+        if piece_type == KING_CODE and abs(end - start) == 2:
+            rook_start, rook_end = CASTLING_ROOKS[end]
+            rook = squares[rook_start]
+            rook_bits = 1 << rook_start | 1 << rook_end
+            self.bitboards[rook] ^= rook_bits
+            self.colors[rook >> 3] ^= rook_bits
+            squares[rook_end] = rook
+            squares[rook_start] = EMPTY
+            key ^= PIECE_KEYS[rook][rook_start] ^ PIECE_KEYS[rook][rook_end]
+
+        # A king or rook leaving its square, or a rook captured on it,
+        # removes the castling rights tied to that square
+        if self.castling:
+            castling = self.castling & CASTLING_MASKS[start] & CASTLING_MASKS[end]
+            key ^= CASTLING_KEYS[self.castling] ^ CASTLING_KEYS[castling]
+            self.castling = castling
+
+        if self.en_passant >= 0:
+            key ^= EN_PASSANT_KEYS[self.en_passant % 8]
+        self.en_passant = NO_SQUARE
+
+        # Only keep an en passant square an enemy pawn could capture on, so
+        # the same position always gets the same key
+        if piece_type == PAWN_CODE and abs(end - start) == 16:
+            passed = (start + end) // 2
+            enemy_pawns = self.bitboards[
+                PAWN_CODE | (BLACK_PIECE ^ moved & BLACK_PIECE)
+            ]
+            if PAWN_ATTACKS[moved >> 3][passed] & enemy_pawns:
+                self.en_passant = passed
+                key ^= EN_PASSANT_KEYS[passed % 8]
+
+        if captured or piece_type == PAWN_CODE:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if not self.white_to_play:
+            self.fullmove_number += 1
+        self.white_to_play = not self.white_to_play
+        self.key = key
+        return record
+
+    def undo(self, move, record) -> None:
+        """
+        Takes back `move` using the record `play()` returned for it
+        """
+        start = move & 63
+        end = move >> 6 & 63
+        squares = self.squares
+        placed = squares[end]
+        moved = PAWN_CODE | placed & BLACK_PIECE if move >> 12 else placed
+        captured = record[0]
+        start_bit = 1 << start
+        end_bit = 1 << end
+
+        self.bitboards[placed] ^= end_bit
+        self.bitboards[moved] ^= start_bit
+        self.colors[moved >> 3] ^= start_bit | end_bit
+        squares[start] = moved
+        squares[end] = EMPTY
+        if captured:
+            captured_square = end
+            if moved & PIECE_TYPE == PAWN_CODE and end == record[2]:
+                captured_square = end + 8 if moved & BLACK_PIECE == 0 else end - 8
+            captured_bit = 1 << captured_square
+            self.bitboards[captured] ^= captured_bit
+            self.colors[captured >> 3] ^= captured_bit
+            squares[captured_square] = captured
+
+        if moved & PIECE_TYPE == KING_CODE and abs(end - start) == 2:
+            rook_start, rook_end = CASTLING_ROOKS[end]
+            rook = squares[rook_end]
+            rook_bits = 1 << rook_start | 1 << rook_end
+            self.bitboards[rook] ^= rook_bits
+            self.colors[rook >> 3] ^= rook_bits
+            squares[rook_start] = rook
+            squares[rook_end] = EMPTY
 
-        # White Pieces
-        self.board[7][0] = Rook(True)
-        self.board[7][1] = Knight(True)
-        self.board[7][2] = Bishop(True)
-        self.board[7][3] = Queen(True)
-        self.board[7][4] = King(True)
-        self.board[7][5] = Bishop(True)
-        self.board[7][6] = Knight(True)
-        self.board[7][7] = Rook(True)
-
-        # Add white pawns on the next row
-        for pos in range(8):
-            self.board[6][pos] = Pawn(True)
-
-        # Black Pieces
-        self.board[0][0] = Rook(False)
-        self.board[0][1] = Knight(False)
-        self.board[0][2] = Bishop(False)
-        self.board[0][3] = Queen(False)
-        self.board[0][4] = King(False)
-        self.board[0][5] = Bishop(False)
-        self.board[0][6] = Knight(False)
-        self.board[0][7] = Rook(False)
-
-        # Place the black pawns
-        for pos in range(8):
-            self.board[1][pos] = Pawn(False)
+        self.white_to_play = not self.white_to_play
+        if not self.white_to_play:
+            self.fullmove_number -= 1
+        self.castling, self.en_passant, self.halfmove_clock, self.key = record[1:]
+
+    @property
+    def board(self):
+        return [
+            [PIECES.get(code) for code in self.squares[row : row + 8]]
+            for row in range(0, 64, 8)
+        ]
 
 
 class ChessEngine:
@@ -88,61 +347,223 @@ class ChessEngine:
     Methods
     -----
 
-    `move(initial_pos, destination)`: Moves a piece from initial_pos to the destination based on `is_valid_move()` of the piece. # noqa
-    `promote(position)`: Promotes a pawn once it's reached opponent's side
+    `make_move(initial_pos, destination, promotion)`: Moves a piece from initial_pos to the destination if the move is legal, returns the encoded move or `None`. # noqa
+    `from_fen(fen)`, `to_fen()`: Start from and write out a FEN position
+    `legal_moves()`: Every legal move of the side to play, encoded as in `chess.moves`
+    `legal_targets(position)`: The squares the piece on `position` can move to
+    `push(move)`, `pop()`: Play and take back moves in place, for search, takebacks and replays
+    `in_check()`, `outcome()`: Whether the side to play is in check, and how the game ended, if it did
+    `evaluate()`, `evaluate_batch(positions)`: Static scores, see `chess.evaluation`
+    `search(time_ms, max_depth)`: The computer's move within a time budget, see `chess.search`
+
+    `moves_history` lists the encoded moves played so far, and `result` is
+    the `Outcome` once a move of `make_move()` ended the game.
+
+    Castling is played as a king move of two squares, en passant as a pawn
+    capture onto the board's `en_passant` square, and a pawn reaching the
+    last rank becomes `promotion`, a queen unless another piece code is
+    given.
 
     """
 
     def __init__(self) -> None:
-        self.white_to_play = True
         self.board = ChessBoard()
+        self.undo_stack = []
         self.moves_history = []
         self.captures = []
         self.messages = []
+        self.result = None
+        # How many times each position was reached, by Zobrist key
+        self.repetitions = Counter([self.board.key])
+
+    @property
+    def white_to_play(self) -> bool:
+        return self.board.white_to_play
+
+    @white_to_play.setter
+    def white_to_play(self, value) -> None:
+        self.board.white_to_play = value
+
+    @property
+    def zobrist_key(self) -> int:
+        """
+        The 64 bit hash of the current position, see `chess.zobrist`
+        """
+        return self.board.key
+
+    @classmethod
+    def from_fen(cls, fen):
+        """
+        Returns an engine set up on the position of a FEN string,
+        see `chess.fen`
+        """
+        from chess.fen import load_fen  # chess.fen builds on this module
+
+        engine = cls()
+        engine.board = load_fen(fen)
+        engine.repetitions = Counter([engine.board.key])
+        engine.result = engine.outcome()
+        return engine
+
+    def to_fen(self) -> str:
+        """
+        The current position as a FEN string
+        """
+        from chess.fen import dump_fen
+
+        return dump_fen(self.board)
+
+    def legal_moves(self):
+        """
+        Returns every legal move of the side to play, see `chess.moves` for
+        the encoding. Move lists are shared through `chess.cache.move_cache`.
+        """
+        return move_cache.get(self.board)
+
+    def legal_targets(self, position):
+        """
+        Returns the `[row, column]` of every square the piece on `position`
+        can legally move to
+        """
+        start = position[0] * 8 + position[1]
+        targets = {move >> 6 & 63 for move in self.legal_moves() if move & 63 == start}
+        return [[end // 8, end % 8] for end in sorted(targets)]
+
+    def push(self, move) -> None:
+        """
+        Plays a legal encoded move, keeping what `pop()` needs to take it back
+        """
+        record = self.board.play(move)
+        self.undo_stack.append(record)
+        self.moves_history.append(move)
+        self.repetitions[self.board.key] += 1
+        if record[0]:
+            self.captures.append(PIECES[record[0]])
+
+    def pop(self):
+        """
+        Takes back the last move and returns it
+        """
+        move = self.moves_history.pop()
+        record = self.undo_stack.pop()
+        self.repetitions[self.board.key] -= 1
+        self.board.undo(move, record)
+        if record[0]:
+            self.captures.pop()
+        self.result = None
+        return move
+
+    def in_check(self) -> bool:
+        return in_check(self.board)
+
+    def insufficient_material(self) -> bool:
+        """
+        Whether neither side can mate: bare kings, a single minor piece, or
+        bishops all on squares of one color. Read from the bitboards.
+        """
+        bitboards = self.board.bitboards
+        for code in (PAWN_CODE, ROOK_CODE, QUEEN_CODE):
+            if bitboards[code] | bitboards[code | BLACK_PIECE]:
+                return False
+        knights = bitboards[KNIGHT_CODE] | bitboards[KNIGHT_CODE | BLACK_PIECE]
+        bishops = bitboards[BISHOP_CODE] | bitboards[BISHOP_CODE | BLACK_PIECE]
+        if (knights | bishops).bit_count() <= 1:
+            return True
+        return not knights and (
+            not bishops & LIGHT_SQUARES or bishops & LIGHT_SQUARES == bishops
+        )
+
+    def outcome(self):
+        """
+        Returns the `Outcome` of the game if the position ends it, else
+        `None`. Every check looks at state kept up to date move by move:
+        the shared legal move list, the king's bitboard, the halfmove
+        clock, the repetition counts and the piece bitboards.
+        """
+        if not self.legal_moves():
+            if not self.in_check():
+                return Outcome(DRAWN, STALEMATE)
+            return Outcome(BLACK_WON if self.white_to_play else WHITE_WON, CHECKMATE)
+        if self.board.halfmove_clock >= 100:
+            return Outcome(DRAWN, FIFTY_MOVES)
+        if self.repetitions[self.board.key] >= 3:
+            return Outcome(DRAWN, REPETITION)
+        if self.insufficient_material():
+            return Outcome(DRAWN, INSUFFICIENT_MATERIAL)
+        return None
+
+    def evaluate(self) -> int:
+        """
+        Scores the position in centipawns for the side to play,
+        see `chess.evaluation`
+        """
+        return evaluate(self.board)
+
+    @staticmethod
+    def evaluate_batch(positions):
+        """
+        Scores many `ChessBoard`s at once, returns a NumPy array of scores
+        """
+        return evaluate_batch(positions)
+
+    def search(self, time_ms=1000, max_depth=MAX_DEPTH):
+        """
+        Looks for the best move of the side to play within `time_ms`,
+        see `chess.search.Searcher`
+        """
+        return Searcher(self.board, time_ms=time_ms, max_depth=max_depth).search()
+
+    def make_move(self, initial_pos, destination, promotion=QUEEN_CODE):
+        if self.result is not None:
+            create_message(detail=GAME_OVER, messages=self.messages)
+            print(GAME_OVER)
+            return
 
-    def make_move(self, initial_pos, destination):
-        if (
-            self.board.board[initial_pos[0]][initial_pos[1]] is None
-        ):  # Don't move  blank
+        squares = self.board.squares
+        start = initial_pos[0] * 8 + initial_pos[1]
+        end = destination[0] * 8 + destination[1]
+
+        moved = squares[start]
+        if moved == EMPTY:  # Don't move  blank
             create_message(detail=NO_PIECE_MOVED, messages=self.messages)
             print(NO_PIECE_MOVED)
             return
 
         # In case you accidentally pick an opponent's piece
-        selected_piece = self.board.board[initial_pos[0]][initial_pos[1]]
+        selected_piece = PIECES[moved]
         if self.white_to_play != selected_piece.color:
             create_message(detail=PIECE_RESTRAINED, messages=self.messages)
             print(PIECE_RESTRAINED)
             return
 
         # Check if a piece is blocking the path
-        target_piece = self.board.board[destination[0]][destination[1]]
-        is_target = target_piece is not None
-
-        if is_target and (
-            self.board.board[initial_pos[0]][initial_pos[1]].color == target_piece.color
-        ):
+        captured = squares[end]
+        if captured != EMPTY and (captured & BLACK_PIECE) == (moved & BLACK_PIECE):
             create_message(detail=PATH_BLOCKED, messages=self.messages)
             print(PATH_BLOCKED)
             return
 
-        # Capture the piece
-        if target_piece is not None:
-            self.captures.append(target_piece)
-
-        # Move the piece selected to the destination
-        self.board.board[destination[0]][destination[1]] = selected_piece
+        last_row = 0 if selected_piece.color else 7
+        if moved & PIECE_TYPE == PAWN_CODE and end // 8 == last_row:
+            move = encode_move(start, end, promotion)
+        else:
+            move = encode_move(start, end)
+        if move not in self.legal_moves():
+            create_message(detail=ILLEGAL_MOVE, messages=self.messages)
+            print(ILLEGAL_MOVE)
+            return
 
-        # log the move
-        self.moves_history.append(
-            [[initial_pos[0], initial_pos[1]], [destination[0], destination[1]]]
-        )
+        # Move the piece selected to the destination, capturing any piece there
+        self.push(move)
 
-        self.board.board[initial_pos[0]][initial_pos[1]] = None
         message = f"{WHITE if selected_piece.color else BLACK}{selected_piece} moved."
+        result = self.result = self.outcome()
+        if result is not None and result.winner == DRAWN:
+            message += f" Draw by {result.reason}."
+        elif result is not None:
+            message += f" {result.winner} wins by {result.reason}."
+        elif self.in_check():
+            message += f" {CHECK}"
         print(message)
         create_message(detail=message, messages=self.messages)
-
-        # Switch players
-        self.white_to_play = not self.white_to_play
-        message = "White's turn" if self.white_to_play else "Black's turn"
+        return move
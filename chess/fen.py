@@ -0,0 +1,146 @@
+"""
+  Reading and writing positions in Forsyth-Edwards Notation, eg.
+
+  `rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1`
+
+  The piece placement is turned into the board's 64 piece codes with one
+  `str.translate`: every letter maps to the character of its piece code and
+  every digit to that many blank squares, so parsing runs no python loop
+  per square.
+"""
+from chess.bitboards import PAWN_ATTACKS, squares_of
+from chess.constants import (
+    BLACK,
+    BLACK_KINGSIDE,
+    BLACK_PIECE,
+    BLACK_QUEENSIDE,
+    CODES_TO_PIECES,
+    EMPTY,
+    NO_SQUARE,
+    PAWN_CODE,
+    PIECE_CODES,
+    SQUARE_NAMES,
+    SQUARES,
+    WHITE,
+    WHITE_KINGSIDE,
+    WHITE_QUEENSIDE,
+)
+from chess.engine import ChessBoard
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+CASTLING_LETTERS = {
+    "K": WHITE_KINGSIDE,
+    "Q": WHITE_QUEENSIDE,
+    "k": BLACK_KINGSIDE,
+    "q": BLACK_QUEENSIDE,
+}
+
+# FEN placement character -> piece codes of the squares it stands for
+PLACEMENT = str.maketrans(
+    {
+        **{name: chr(code) for name, code in PIECE_CODES.items()},
+        **{name.lower(): chr(code | BLACK_PIECE) for name, code in PIECE_CODES.items()},
+        **{str(count): chr(EMPTY) * count for count in range(1, 9)},
+    }
+)
+
+# Piece code -> FEN letter
+LETTERS = {
+    **{code: name for code, name in CODES_TO_PIECES.items()},
+    **{code | BLACK_PIECE: name.lower() for code, name in CODES_TO_PIECES.items()},
+}
+CODES = bytes([EMPTY, *LETTERS])
+
+
+def load_fen(fen) -> ChessBoard:
+    """
+    Builds a `ChessBoard` from a FEN string. The move clocks are optional.
+    Raises `ValueError` for a malformed FEN.
+    """
+    fields = fen.split()
+    if not 4 <= len(fields) <= 6:
+        raise ValueError(f"Invalid FEN: {fen}")
+    placement, color, castling, en_passant = fields[:4]
+
+    ranks = placement.translate(PLACEMENT).split("/")
+    if len(ranks) != 8 or any(len(rank) != 8 for rank in ranks):
+        raise ValueError(f"Invalid FEN placement: {placement}")
+    # Characters that aren't pieces or digits are left as they were
+    squares = "".join(ranks).encode("utf-8")
+    if len(squares) != 64 or squares.translate(None, CODES):
+        raise ValueError(f"Invalid FEN placement: {placement}")
+
+    if color not in (WHITE, BLACK):
+        raise ValueError(f"Invalid FEN side to move: {color}")
+    white_to_play = color == WHITE
+
+    rights = 0
+    if castling != "-":
+        for letter in castling:
+            if letter not in CASTLING_LETTERS:
+                raise ValueError(f"Invalid FEN castling rights: {castling}")
+            rights |= CASTLING_LETTERS[letter]
+
+    # Like `ChessBoard.play()`, only keep an en passant square a pawn can
+    # capture on, so the position gets the same key however it was reached
+    passed = NO_SQUARE
+    if en_passant != "-":
+        if en_passant not in SQUARES:
+            raise ValueError(f"Invalid FEN en passant square: {en_passant}")
+        passed = SQUARES[en_passant]
+        pawn = PAWN_CODE if white_to_play else PAWN_CODE | BLACK_PIECE
+        attackers = PAWN_ATTACKS[white_to_play][passed]
+        if passed // 8 != (2 if white_to_play else 5) or not any(
+            squares[square] == pawn for square in squares_of(attackers)
+        ):
+            passed = NO_SQUARE
+
+    try:
+        halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+        fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+    except ValueError:
+        raise ValueError(f"Invalid FEN move clocks: {fen}") from None
+
+    return ChessBoard(
+        squares,
+        white_to_play=white_to_play,
+        castling=rights,
+        en_passant=passed,
+        halfmove_clock=halfmove_clock,
+        fullmove_number=fullmove_number,
+    )
+
+
+def dump_fen(board) -> str:
+    """
+    Writes the position of a `ChessBoard` as a FEN string
+    """
+    squares = board.squares
+    rows = []
+    for row in range(0, 64, 8):
+        text = ""
+        blanks = 0
+        for code in squares[row : row + 8]:
+            if code:
+                if blanks:
+                    text += str(blanks)
+                    blanks = 0
+                text += LETTERS[code]
+            else:
+                blanks += 1
+        rows.append(text + str(blanks) if blanks else text)
+
+    castling = "".join(
+        letter for letter, right in CASTLING_LETTERS.items() if board.castling & right
+    )
+    return " ".join(
+        (
+            "/".join(rows),
+            WHITE if board.white_to_play else BLACK,
+            castling or "-",
+            SQUARE_NAMES[board.en_passant] if board.en_passant >= 0 else "-",
+            str(board.halfmove_clock),
+            str(board.fullmove_number),
+        )
+    )
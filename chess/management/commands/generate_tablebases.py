@@ -0,0 +1,46 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from chess.tablebase import TABLES, write_table
+
+
+class Command(BaseCommand):
+    """
+    Generates the endgame tablebases
+    ---
+
+    `python manage.py generate_tablebases [tables] [--output tablebases/]`
+
+    Each table is solved by retrograde analysis, which takes a while, and
+    written to `CHESS_TABLEBASE_DIR` unless `--output` is given.
+    """
+
+    help = "Generate the endgame tablebases by retrograde analysis"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "tables",
+            nargs="*",
+            help=f"Tables to generate, all of them by default: {', '.join(TABLES)}",
+        )
+        parser.add_argument("--output", default=settings.CHESS_TABLEBASE_DIR)
+
+    def handle(self, *args, **options):
+        directory = options["output"]
+        if not directory:
+            raise CommandError("Set CHESS_TABLEBASE_DIR or give --output")
+        unknown = set(options["tables"]) - set(TABLES)
+        if unknown:
+            raise CommandError(f"Unknown tables: {', '.join(sorted(unknown))}")
+
+        os.makedirs(directory, exist_ok=True)
+        for name in options["tables"] or TABLES:
+            started = time.perf_counter()
+            write_table(name, directory)
+            self.stdout.write(
+                f"{name}: generated in {time.perf_counter() - started:.1f}s"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Tablebases written to {directory}"))
@@ -0,0 +1,96 @@
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chess.perft import POSITIONS, run_perft
+
+
+class Command(BaseCommand):
+    """
+    Runs perft on the standard test positions
+    ---
+
+    `python manage.py perft [positions] --depth 4 --output perft.json`
+
+    Prints nodes, nodes per second and whether the count matches the known
+    value. `--output` stores the run as JSON and `--compare` prints the speed
+    change against an earlier run, so commits can be compared.
+    """
+
+    help = "Run perft on the standard test positions and report nodes/second"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "positions",
+            nargs="*",
+            help=f"Positions to run, all of them by default: {', '.join(POSITIONS)}",
+        )
+        parser.add_argument("--depth", type=int, default=3)
+        parser.add_argument("--output", help="Write the results to this JSON file")
+        parser.add_argument("--compare", help="JSON file of an earlier run")
+
+    def handle(self, *args, **options):
+        depth = options["depth"]
+        if depth < 1:
+            raise CommandError("Depth must be at least 1")
+
+        unknown = set(options["positions"]) - set(POSITIONS)
+        if unknown:
+            raise CommandError(f"Unknown positions: {', '.join(sorted(unknown))}")
+
+        previous = {}
+        if options["compare"]:
+            with open(options["compare"]) as file:
+                for result in json.load(file)["results"]:
+                    previous[(result["position"], result["depth"])] = result
+
+        results = []
+        for name in options["positions"] or POSITIONS:
+            result = run_perft(name, depth)
+            results.append(result)
+
+            line = (
+                f"{name:<10} depth {depth}  {result['nodes']:>10} nodes  "
+                f"{result['seconds']:>8.3f}s  {result['nps']:>9} nps"
+            )
+            before = previous.get((name, depth))
+            if before and before["nps"]:
+                change = (result["nps"] - before["nps"]) / before["nps"] * 100
+                line += f"  ({change:+.1f}%)"
+            if result["passed"]:
+                self.stdout.write(line)
+            else:
+                self.stdout.write(
+                    self.style.ERROR(f"{line}  expected {result['expected']}")
+                )
+
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(
+                    {
+                        "commit": self.get_commit(),
+                        "created": datetime.now(timezone.utc).isoformat(),
+                        "python": platform.python_version(),
+                        "results": results,
+                    },
+                    file,
+                    indent=2,
+                )
+
+        failed = [result["position"] for result in results if not result["passed"]]
+        if failed:
+            raise CommandError(f"Node counts differ for: {', '.join(failed)}")
+
+    def get_commit(self):
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True,
+                check=True,
+                text=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -1,7 +1,51 @@
+import sys
+from array import array
+
 from chess.constants import BLOCKED_MOVE, ILLEGAL_MOVE
 from chess.services import create_message
 
 
+def encode_move(start, end, promotion=0) -> int:
+    """
+    Packs a move into a 16 bit int:
+
+    `bits 0-5` -> the starting square
+
+    `bits 6-11` -> the finishing square
+
+    `bits 12-14` -> the piece code a pawn is promoted to, `0` if none
+
+    """
+    return start | end << 6 | promotion << 12
+
+
+def decode_move(move):
+    """
+    Returns the `(start, end, promotion)` of an encoded move
+    """
+    return move & 63, move >> 6 & 63, move >> 12
+
+
+def pack_moves(moves) -> bytes:
+    """
+    Packs encoded moves two bytes each, big endian, for storage
+    """
+    packed = array("H", moves)
+    if sys.byteorder == "little":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack_moves(data):
+    """
+    Returns the `array("H")` of encoded moves `pack_moves()` packed
+    """
+    moves = array("H", bytes(data))
+    if sys.byteorder == "little":
+        moves.byteswap()
+    return moves
+
+
 def rooks_moves(board, starting_pos, ending_pos) -> bool:
     """
     Takes in three params:
@@ -24,7 +68,7 @@ def rooks_moves(board, starting_pos, ending_pos) -> bool:
 
         for position in range(down + 1, up):
             # If there's a piece on that place, don't place the rook
-            if board.board[starting_pos[0]][position] is not None:
+            if board.board.piece_at(starting_pos[0], position) is not None:
                 print(BLOCKED_MOVE)
                 create_message(detail=BLOCKED_MOVE, messages=board.messages)
                 return False
@@ -37,7 +81,7 @@ def rooks_moves(board, starting_pos, ending_pos) -> bool:
 
         # This check prevents the -1 list indexing possibility
         for position in range(left + 1, right):
-            if board.board[position][starting_pos[1]] is not None:
+            if board.board.piece_at(position, starting_pos[1]) is not None:
                 print(BLOCKED_MOVE)
                 create_message(detail=BLOCKED_MOVE, messages=board.messages)
                 return False
@@ -76,7 +120,7 @@ def bishops_moves(board, starting_pos, finishing_pos) -> bool:
 
     while movement_possible:
         # Check if the intended slot has a piece already
-        if board.board[x_position][y_position] is not None:
+        if board.board.piece_at(x_position, y_position) is not None:
             print(BLOCKED_MOVE + f" [{x_position}, {y_position}]")
             return False
 
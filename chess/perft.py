@@ -0,0 +1,90 @@
+"""
+  Perft: counting the leaf nodes of the legal move tree to a fixed depth.
+
+  Node counts of the standard test positions are well known, so comparing
+  against them checks the move generator, and timing them measures its speed.
+  See https://www.chessprogramming.org/Perft_Results
+"""
+import time
+
+from chess.bitboards import legal_moves
+from chess.fen import START_FEN, load_fen
+
+# name -> (FEN, known node counts from depth 1)
+POSITIONS = {
+    "start": (START_FEN, [20, 400, 8902, 197281, 4865609, 119060324]),
+    "kiwipete": (
+        "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+        [48, 2039, 97862, 4085603, 193690690],
+    ),
+    "position3": (
+        "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+        [14, 191, 2812, 43238, 674624, 11030083],
+    ),
+    "position4": (
+        "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+        [6, 264, 9467, 422333, 15833292],
+    ),
+    "position5": (
+        "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+        [44, 1486, 62379, 2103487, 89941194],
+    ),
+    "position6": (
+        "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+        [46, 2079, 89890, 3894594, 164075551],
+    ),
+}
+
+
+def perft(board, depth) -> int:
+    """
+    Counts the leaf nodes `depth` plies below `board`
+    """
+    moves = legal_moves(board)
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+
+    nodes = 0
+    for move in moves:
+        record = board.play(move)
+        nodes += perft(board, depth - 1)
+        board.undo(move, record)
+    return nodes
+
+
+def divide(board, depth):
+    """
+    Returns the node count below each legal move, to find where a count is off
+    """
+    counts = {}
+    for move in legal_moves(board):
+        record = board.play(move)
+        counts[move] = perft(board, depth - 1)
+        board.undo(move, record)
+    return counts
+
+
+def run_perft(name, depth):
+    """
+    Runs perft on one of the `POSITIONS` and returns a result dict:
+
+    `position`, `depth`, `nodes`, `expected` (`None` when unknown),
+    `passed`, `seconds`, `nps` (nodes per second)
+    """
+    fen, known = POSITIONS[name]
+    board = load_fen(fen)
+
+    started = time.perf_counter()
+    nodes = perft(board, depth)
+    seconds = time.perf_counter() - started
+
+    expected = known[depth - 1] if depth <= len(known) else None
+    return {
+        "position": name,
+        "depth": depth,
+        "nodes": nodes,
+        "expected": expected,
+        "passed": expected is None or nodes == expected,
+        "seconds": round(seconds, 4),
+        "nps": int(nodes / seconds) if seconds else 0,
+    }
@@ -0,0 +1,240 @@
+"""
+  Reading and writing games in Portable Game Notation.
+
+  `read_games()` is a generator over the lines of a PGN file: it holds one
+  game at a time, so archives of any size are read in constant memory.
+  Moves are in Standard Algebraic Notation, `parse_san()` and `san()`
+  convert them from and to the encoded moves of `chess.moves`.
+"""
+import re
+
+from chess.bitboards import legal_moves
+from chess.constants import (
+    BLACK_PIECE,
+    CODES_TO_PIECES,
+    KING_CODE,
+    PAWN_CODE,
+    PIECE_CODES,
+    PIECE_TYPE,
+    SQUARE_NAMES,
+    SQUARES,
+)
+from chess.moves import decode_move
+from chess.search import in_check
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+
+HEADER = re.compile(r'^\[(\w+)\s+"((?:[^"\\]|\\.)*)"\]\s*$')
+SAN = re.compile(
+    r"^(?P<piece>[NBRQK])?(?P<file>[a-h])?(?P<rank>[1-8])?x?"
+    r"(?P<end>[a-h][1-8])(?:=?(?P<promotion>[NBRQ]))?$"
+)
+# Comments, variations and annotation glyphs, none of which change the game
+SKIPPED = re.compile(r"\{[^}]*\}|;[^\n]*|\$\d+")
+MOVE_NUMBER = re.compile(r"^\d+\.+")
+
+CASTLING = {"O-O": 2, "O-O-O": -2}  # how far the king moves along its rank
+
+
+class PgnError(ValueError):
+    """
+    Raised for a game that can't be read, or a move that isn't legal
+    """
+
+
+class PgnGame:
+    """
+    One game of a PGN file
+
+    `headers: dict`: The tag pairs, eg. `{"White": "Carlsen"}`
+
+    `movetext: str`: The moves as written, comments and all
+
+    `sans()`: The moves in SAN, without move numbers, comments, variations
+    or the result
+    """
+
+    def __init__(self, headers, movetext) -> None:
+        self.headers = headers
+        self.movetext = movetext
+
+    def sans(self):
+        text = SKIPPED.sub(" ", self.movetext)
+
+        # Drop variations, which can nest
+        depth = 0
+        kept = []
+        for part in re.split(r"([()])", text):
+            if part == "(":
+                depth += 1
+            elif part == ")":
+                depth = max(0, depth - 1)
+            elif depth == 0:
+                kept.append(part)
+
+        for token in " ".join(kept).split():
+            token = MOVE_NUMBER.sub("", token)
+            if token and token not in RESULTS:
+                yield token
+
+
+def in_comment(line, inside=False) -> bool:
+    """
+    Whether a `{...}` comment is still open at the end of `line`, `inside`
+    telling if one was open at its start
+    """
+    for char in line:
+        if inside:
+            inside = char != "}"
+        elif char == "{":
+            inside = True
+        elif char == ";":
+            # The rest of the line is a comment, braces and all
+            break
+    return inside
+
+
+def read_games(lines):
+    """
+    Yields a `PgnGame` for every game in an iterable of lines
+    """
+    headers = {}
+    movetext = []
+    commenting = False
+    for line in lines:
+        line = line.strip()
+        # A comment spanning lines may hold anything, even a `[`
+        if not commenting and line.startswith("["):
+            # A header after moves starts the next game
+            if movetext:
+                yield PgnGame(headers, "\n".join(movetext))
+                headers, movetext = {}, []
+            match = HEADER.match(line)
+            if match:
+                headers[match[1]] = match[2].replace('\\"', '"')
+        elif commenting or line and not line.startswith("%"):
+            # Lines are kept apart so a `;` comment ends with its line
+            movetext.append(line)
+            commenting = in_comment(line, commenting)
+    if headers or movetext:
+        yield PgnGame(headers, "\n".join(movetext))
+
+
+def parse_san(board, text, moves=None):
+    """
+    Returns the encoded legal move `text` stands for on `board`.
+    `moves` are the legal moves of the board, when already known.
+    """
+    text = text.rstrip("+#!?")
+    if moves is None:
+        moves = legal_moves(board)
+    squares = board.squares
+
+    castle = text.replace("0", "O")
+    if castle in CASTLING:
+        step = CASTLING[castle]
+        side = 0 if board.white_to_play else BLACK_PIECE
+        king = board.bitboards[KING_CODE | side]
+        start = king.bit_length() - 1
+        candidates = [
+            move
+            for move in moves
+            if move & 63 == start and (move >> 6 & 63) == start + step
+        ]
+    else:
+        match = SAN.match(text)
+        if match is None:
+            raise PgnError(f"Not a move: {text}")
+        piece = PIECE_CODES[match["piece"]] if match["piece"] else PAWN_CODE
+        end = SQUARES[match["end"]]
+        promotion = PIECE_CODES[match["promotion"]] if match["promotion"] else 0
+        candidates = []
+        for move in moves:
+            start, target, promoted = decode_move(move)
+            name = SQUARE_NAMES[start]
+            if (
+                target == end
+                and promoted == promotion
+                and squares[start] & PIECE_TYPE == piece
+                and match["file"] in (None, name[0])
+                and match["rank"] in (None, name[1])
+            ):
+                candidates.append(move)
+
+    if len(candidates) != 1:
+        reason = "Illegal" if not candidates else "Ambiguous"
+        raise PgnError(f"{reason} move: {text}")
+    return candidates[0]
+
+
+def san(board, move, moves=None) -> str:
+    """
+    Writes a legal encoded move of `board` in SAN, with `+` or `#` when it
+    gives check or mate
+    """
+    if moves is None:
+        moves = legal_moves(board)
+    start, end, promotion = decode_move(move)
+    piece = board.squares[start] & PIECE_TYPE
+    capture = bool(board.squares[end]) or (piece == PAWN_CODE and start % 8 != end % 8)
+
+    if piece == KING_CODE and abs(end - start) == 2:
+        text = "O-O" if end > start else "O-O-O"
+    elif piece == PAWN_CODE:
+        text = (SQUARE_NAMES[start][0] + "x") if capture else ""
+        text += SQUARE_NAMES[end]
+        if promotion:
+            text += "=" + CODES_TO_PIECES[promotion]
+    else:
+        text = CODES_TO_PIECES[piece]
+
+        # Name the file, or rank, or both, when another piece of the same
+        # kind could go to the same square
+        others = [
+            other & 63
+            for other in moves
+            if other >> 6 & 63 == end
+            and other & 63 != start
+            and board.squares[other & 63] & PIECE_TYPE == piece
+        ]
+        if others:
+            name = SQUARE_NAMES[start]
+            if all(SQUARE_NAMES[other][0] != name[0] for other in others):
+                text += name[0]
+            elif all(SQUARE_NAMES[other][1] != name[1] for other in others):
+                text += name[1]
+            else:
+                text += name
+        text += ("x" if capture else "") + SQUARE_NAMES[end]
+
+    record = board.play(move)
+    if in_check(board):
+        text += "#" if not legal_moves(board) else "+"
+    board.undo(move, record)
+    return text
+
+
+def write_game(headers, sans, result="*", width=80) -> str:
+    """
+    Writes one game as PGN: the tag pairs, then the numbered moves wrapped
+    at `width` characters, then the result
+    """
+    lines = [f'[{tag} "{value}"]' for tag, value in headers.items()]
+    lines.append("")
+
+    tokens = []
+    for ply, text in enumerate(sans):
+        if ply % 2 == 0:
+            tokens.append(f"{ply // 2 + 1}.")
+        tokens.append(text)
+    tokens.append(result)
+
+    line = ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > width:
+            lines.append(line)
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    lines.append(line)
+    return "\n".join(lines) + "\n\n"
@@ -1,10 +1,12 @@
 from chess.constants import (
     BISHOP,
+    BLACK_PIECE,
     BLOCKED_MOVE,
     ILLEGAL_MOVE,
     KING,
     KNIGHT,
     PAWN,
+    PIECE_CODES,
     QUEEN,
     ROOK,
 )
@@ -30,6 +32,9 @@ class ChessPiece:
 
     A piece takes a color, and this will be alternated throughout every move
 
+    Pieces hold no per-game state. The board stores a one-byte code per square
+    and looks up the shared instance for that code in `PIECES`.
+
     COntains two methods:
     `is_white_player`: To check if it's a white piece
     `is_valid_move`: To check if the move made is valid for the piece
@@ -46,6 +51,10 @@ class ChessPiece:
     def is_white(self):
         return self.color
 
+    @property
+    def code(self) -> int:
+        return PIECE_CODES[self.name] | (0 if self.color else BLACK_PIECE)
+
     def __str__(self) -> str:
         return self.name
 
@@ -178,12 +187,14 @@ class Pawn(ChessPiece):
     1. It doesn't capture along it's movement lines
     2. It has a possibility to make a two-step move on the first play
     3. It can get promoted
+
+    En passant and promotion are generated by `chess.bitboards` from the
+    board's `en_passant` square, like castling from its castling rights.
     """
 
     def __init__(self, color) -> None:
         super().__init__(color)
         self.name = PAWN
-        self.first_move = True
 
     def is_valid_move(self, board, starting_position, finishing_position) -> bool:
         # Prevent from capturing your own pieces
@@ -193,11 +204,7 @@ class Pawn(ChessPiece):
                 (starting_position[1] == finishing_position[1] + 1)
                 or starting_position[1] == finishing_position[1] - 1
             ):
-                if (
-                    board.board[finishing_position[0]][finishing_position[1]]
-                    is not None
-                ):
-                    self.first_move = False
+                if board.board.piece_at(*finishing_position) is not None:
                     return True
                 create_message(detail=ILLEGAL_MOVE, messages=board.messages)
                 print(ILLEGAL_MOVE)
@@ -207,18 +214,16 @@ class Pawn(ChessPiece):
             if starting_position[1] == finishing_position[1]:
                 if (
                     starting_position[0] - finishing_position[0] == 2
-                    and self.first_move
+                    and starting_position[0] == 6
                 ) or (starting_position[0] - finishing_position[0] == 1):
                     for pos in range(
                         starting_position[0] - 1, finishing_position[0] - 1, -1
                     ):
-                        if board.board[pos][starting_position[1]] is not None:
+                        if board.board.piece_at(pos, starting_position[1]) is not None:
                             create_message(detail=ILLEGAL_MOVE, messages=board.messages)
                             print(BLOCKED_MOVE)
                             return False
 
-                    # GHOST PAWN HERE
-                    self.first_move = False
                     return True
                 create_message(ILLEGAL_MOVE)
                 print(ILLEGAL_MOVE)
@@ -230,11 +235,7 @@ class Pawn(ChessPiece):
                 (starting_position[1] == finishing_position[1] - 1)
                 or (starting_position[1] == (finishing_position[1] + 1))
             ):
-                if (
-                    board.board[finishing_position[0]][finishing_position[1]]
-                    is not None
-                ):
-                    self.first_move = False
+                if board.board.piece_at(*finishing_position) is not None:
                     return True
 
                 print(ILLEGAL_MOVE)
@@ -243,19 +244,16 @@ class Pawn(ChessPiece):
             if starting_position[1] == finishing_position[1]:
                 if (
                     (finishing_position[0] - starting_position[0] == 2)
-                    and self.first_move
+                    and starting_position[0] == 1
                 ) or (finishing_position[0] - starting_position[0] == 1):
                     for pos in range(
                         starting_position[0] + 1, finishing_position[0] + 1
                     ):
-                        if board.board[pos][starting_position[1]] is not None:
+                        if board.board.piece_at(pos, starting_position[1]) is not None:
                             create_message(detail=ILLEGAL_MOVE, messages=board.messages)
                             print(ILLEGAL_MOVE)
                             return False
 
-                    # GHOST PAWN HERE
-
-                    self.first_move = False
                     return True
 
                 create_message(detail=ILLEGAL_MOVE, messages=board.messages)
@@ -265,3 +263,11 @@ class Pawn(ChessPiece):
             create_message(detail=ILLEGAL_MOVE, messages=board.messages)
             print(ILLEGAL_MOVE)
             return False
+
+
+# One shared instance per piece code, used by the board to look up behaviour
+PIECES = {
+    piece.code: piece
+    for piece_class in (Pawn, Knight, Bishop, Rook, Queen, King)
+    for piece in (piece_class(True), piece_class(False))
+}
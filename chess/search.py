@@ -0,0 +1,276 @@
+"""
+  The computer opponent.
+
+  A negamax alpha-beta search with iterative deepening under a hard time
+  budget. Moves are ordered by the best move of the previous iteration,
+  captures by MVV-LVA (most valuable victim, least valuable attacker),
+  killer moves and the history heuristic. Leaves are settled by a quiescence
+  search over captures, or every evasion when in check, so the score isn't
+  taken in the middle of an exchange.
+  Results are kept in a transposition table, see `chess.transposition`.
+"""
+import time
+from collections import namedtuple
+
+from chess.bitboards import is_attacked, legal_moves
+from chess.constants import BLACK_PIECE, KING_CODE, PIECE_TYPE, QUEEN_CODE
+from chess.evaluation import evaluate
+from chess.transposition import EXACT, LOWER, UPPER, get_transposition_table
+
+MATE = 100000
+INFINITY = MATE + 1
+MAX_DEPTH = 64
+
+# How many nodes are searched between two looks at the clock, a few
+# milliseconds of search at most
+CHECK_EVERY = 128
+
+SearchResult = namedtuple("SearchResult", ["move", "score", "depth", "nodes", "ms"])
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def to_table(score, ply) -> int:
+    """
+    Mate scores are stored as distance from the stored position, not the root
+    """
+    if score >= MATE - MAX_DEPTH:
+        return score + ply
+    if score <= -MATE + MAX_DEPTH:
+        return score - ply
+    return score
+
+
+def from_table(score, ply) -> int:
+    if score >= MATE - MAX_DEPTH:
+        return score - ply
+    if score <= -MATE + MAX_DEPTH:
+        return score + ply
+    return score
+
+
+def in_check(board) -> bool:
+    king = board.bitboards[KING_CODE | (0 if board.white_to_play else BLACK_PIECE)]
+    return bool(king) and is_attacked(
+        board, king.bit_length() - 1, not board.white_to_play
+    )
+
+
+class Searcher:
+    """
+    Searches a copy of a board for the best move
+    ---
+
+    `board: ChessBoard`: The position, left untouched
+
+    `time_ms: int`: Hard budget for the whole search
+
+    `max_depth: int`: Stop deepening after this many plies
+
+    `evaluate`: Scores a board for the side to play, see `chess.evaluation`
+
+    `table: TranspositionTable`: The process-wide table by default
+
+    `search()` returns a `SearchResult` of the best move, its score in
+    centipawns, the depth of the last completed iteration and the nodes
+    searched. When time runs out the unfinished iteration's best move so far
+    is kept: the previous best is searched first, so it only changed if
+    another move did better at the deeper depth.
+    """
+
+    def __init__(
+        self,
+        board,
+        time_ms=1000,
+        max_depth=MAX_DEPTH,
+        evaluate=evaluate,
+        table=None,
+    ):
+        self.board = board.copy()
+        self.table = table or get_transposition_table()
+        self.time_ms = time_ms
+        self.max_depth = max_depth
+        self.evaluate = evaluate
+        self.nodes = 0
+        self.deadline = 0
+        self.killers = [[0, 0] for _ in range(MAX_DEPTH + 1)]
+        self.history = [0] * 4096
+        # Best root move and score of the iteration being searched
+        self.root_best = None
+
+    def search(self) -> SearchResult:
+        started = time.perf_counter()
+        self.deadline = started + self.time_ms / 1000
+        self.table.new_search()
+
+        root_moves = legal_moves(self.board)
+        if not root_moves:
+            score = -MATE if in_check(self.board) else 0
+            return SearchResult(None, score, 0, 0, 0)
+        root_moves = self.order(root_moves, 0)
+
+        best_move, best_score, depth_reached = root_moves[0], 0, 0
+        for depth in range(1, self.max_depth + 1):
+            self.root_best = None
+            try:
+                move, score = self.search_root(root_moves, depth)
+            except SearchTimeout:
+                if self.root_best is not None:
+                    best_move, best_score = self.root_best
+                break
+            best_move, best_score, depth_reached = move, score, depth
+
+            # Search the best move first in the next iteration
+            root_moves.remove(move)
+            root_moves.insert(0, move)
+            if abs(score) >= MATE - MAX_DEPTH:
+                break
+
+        ms = int((time.perf_counter() - started) * 1000)
+        return SearchResult(best_move, best_score, depth_reached, self.nodes, ms)
+
+    def search_root(self, moves, depth):
+        board = self.board
+        alpha, best_move = -INFINITY, moves[0]
+        for move in moves:
+            record = board.play(move)
+            try:
+                score = -self.negamax(depth - 1, -INFINITY, -alpha, 1)
+            finally:
+                board.undo(move, record)
+            if score > alpha:
+                alpha, best_move = score, move
+                self.root_best = (move, score)
+        self.table.store(board.key, best_move, depth, EXACT, alpha)
+        return best_move, alpha
+
+    def negamax(self, depth, alpha, beta, ply) -> int:
+        if depth <= 0:
+            return self.quiescence(alpha, beta, ply)
+
+        self.count_node()
+        board = self.board
+        table = self.table
+        key = board.key
+
+        hash_move = 0
+        entry = table.probe(key)
+        if entry is not None:
+            hash_move, stored_depth, bound, score = entry
+            if stored_depth >= depth:
+                score = from_table(score, ply)
+                if bound == EXACT:
+                    return score
+                if bound == LOWER:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    return score
+
+        moves = legal_moves(board)
+        if not moves:
+            return -MATE + ply if in_check(board) else 0
+
+        original_alpha = alpha
+        best_move = 0
+        for move in self.order(moves, ply, hash_move):
+            record = board.play(move)
+            try:
+                score = -self.negamax(depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                board.undo(move, record)
+
+            if score >= beta:
+                if not board.squares[move >> 6 & 63]:
+                    self.store_quiet_cutoff(move, depth, ply)
+                table.store(key, move, depth, LOWER, to_table(beta, ply))
+                return beta
+            if score > alpha:
+                alpha, best_move = score, move
+
+        bound = EXACT if alpha > original_alpha else UPPER
+        table.store(key, best_move, depth, bound, to_table(alpha, ply))
+        return alpha
+
+    def quiescence(self, alpha, beta, ply) -> int:
+        self.count_node()
+        board = self.board
+        if ply >= MAX_DEPTH:
+            return self.evaluate(board)
+
+        if in_check(board):
+            # No standing pat in check: every evasion is searched
+            moves = legal_moves(board)
+            if not moves:
+                return -MATE + ply
+            moves = self.order(moves, ply)
+        else:
+            stand_pat = self.evaluate(board)
+            if stand_pat >= beta:
+                return stand_pat
+            alpha = max(alpha, stand_pat)
+
+            # Captures and queen promotions
+            squares = board.squares
+            moves = [
+                move
+                for move in legal_moves(board)
+                if squares[move >> 6 & 63] or move >> 12 == QUEEN_CODE
+            ]
+            moves.sort(key=self.mvv_lva, reverse=True)
+
+        for move in moves:
+            record = board.play(move)
+            try:
+                score = -self.quiescence(-beta, -alpha, ply + 1)
+            finally:
+                board.undo(move, record)
+
+            if score >= beta:
+                return beta
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def order(self, moves, ply, hash_move=0):
+        """
+        Sorts the move from the transposition table first, captures by
+        MVV-LVA, then killer moves, then quiet moves by their history score
+        """
+        squares = self.board.squares
+        killers = self.killers[ply]
+        history = self.history
+
+        def priority(move):
+            if move == hash_move:
+                return 1 << 31
+            if squares[move >> 6 & 63]:
+                return 1 << 30 | self.mvv_lva(move)
+            if move == killers[0]:
+                return 1 << 29
+            if move == killers[1]:
+                return (1 << 29) - 1
+            return history[move & 4095]
+
+        return sorted(moves, key=priority, reverse=True)
+
+    def mvv_lva(self, move) -> int:
+        squares = self.board.squares
+        victim = squares[move >> 6 & 63] & PIECE_TYPE
+        attacker = squares[move & 63] & PIECE_TYPE
+        return victim * 8 - attacker
+
+    def store_quiet_cutoff(self, move, depth, ply) -> None:
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        self.history[move & 4095] += depth * depth
+
+    def count_node(self) -> None:
+        self.nodes += 1
+        if not self.nodes % CHECK_EVERY and time.perf_counter() >= self.deadline:
+            raise SearchTimeout
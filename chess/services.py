@@ -5,3 +5,15 @@ def create_message(detail, messages):
     """
     messages.append(detail)
     return str(detail)
+
+
+def get_setting(name, default):
+    """
+    Reads an engine setting from the django settings, falling back to
+    `default` when the engine is used without configured settings
+    """
+    from django.conf import settings
+
+    if not settings.configured:
+        return default
+    return getattr(settings, name, default)
@@ -0,0 +1,259 @@
+"""
+  Endgame tablebases: the exact result of every position of a small ending.
+
+  A table covers the kings and one white piece, eg. `KQK`, and stores one
+  byte per position for both sides to move, indexed by
+
+  `((side to move * 64 + white king) * 64 + black king) * 64 + piece`
+
+  The byte is `0` for a draw, or an impossible position, and `plies + 1`
+  otherwise, `plies` being the distance to mate with best play: odd when the
+  side to move mates, even when it gets mated. Positions where black has the
+  piece are probed with the board mirrored.
+
+  Tables are generated by retrograde analysis with `manage.py
+  generate_tablebases` and memory mapped, so a probe reads one page of a file
+  the processes share rather than a copy in each one's heap.
+"""
+import mmap
+import os
+import struct
+from array import array
+from collections import namedtuple
+
+import numpy as np
+
+from chess.bitboards import is_attacked, legal_moves
+from chess.constants import BLACK_PIECE, KING_CODE, PIECE_CODES, PIECE_TYPE
+from chess.engine import ChessBoard
+from chess.services import get_setting
+
+MAGIC = b"CHTB"
+VERSION = 1
+HEADER = struct.Struct(">4sI")
+
+# Endings of one piece that can't change: a pawn's promotions would lead
+# into the other tables
+TABLES = ("KQK", "KRK")
+POSITIONS = 2 * 64 * 64 * 64
+
+Probe = namedtuple("Probe", "wdl plies")
+Probe.__doc__ = """
+    `wdl: int`: `1` when the side to move wins, `0` for a draw, `-1` when it
+    loses
+
+    `plies: int`: Plies to mate with best play, `0` for a draw
+"""
+DRAWN = Probe(0, 0)
+
+
+def position_index(white_to_play, white_king, black_king, piece) -> int:
+    return (((not white_to_play) * 64 + white_king) * 64 + black_king) * 64 + piece
+
+
+def generate(name):
+    """
+    Solves the table `name` and returns its bytes
+    ---
+
+    Every position's legal moves are generated once with `chess.bitboards`
+    and kept as an edge list. Mates are then propagated backwards one ply
+    per pass with NumPy: a position wins in `n` plies when a move leads to
+    a loss in `n - 1`, and loses in `n` when every move leads to a win, the
+    longest one in `n - 1` plies. Positions left unsolved are draws.
+    """
+    piece = PIECE_CODES[name[1]]
+    parents = array("i")
+    children = array("i")
+    valid = np.zeros(POSITIONS, dtype=bool)
+    mated = np.zeros(POSITIONS, dtype=bool)
+    has_moves = np.zeros(POSITIONS, dtype=bool)
+    # The child of a move capturing the piece: a draw with bare kings
+    bare_kings = POSITIONS
+
+    squares = bytearray(64)
+    for index in range(POSITIONS):
+        side, rest = divmod(index, 64 * 64 * 64)
+        white_king, rest = divmod(rest, 64 * 64)
+        black_king, piece_square = divmod(rest, 64)
+        if len({white_king, black_king, piece_square}) < 3:
+            continue
+
+        squares[white_king] = KING_CODE
+        squares[black_king] = KING_CODE | BLACK_PIECE
+        squares[piece_square] = piece
+        board = ChessBoard(squares, white_to_play=not side, castling=0)
+        squares[white_king] = squares[black_king] = squares[piece_square] = 0
+
+        # The side that just moved can't be left in check
+        waiting_king = black_king if board.white_to_play else white_king
+        if is_attacked(board, waiting_king, board.white_to_play):
+            continue
+        valid[index] = True
+
+        moves = legal_moves(board)
+        if not moves:
+            king = white_king if board.white_to_play else black_king
+            mated[index] = is_attacked(board, king, not board.white_to_play)
+            continue
+        has_moves[index] = True
+        for move in moves:
+            start, end = move & 63, move >> 6 & 63
+            if end == piece_square:
+                child = bare_kings
+            elif start == white_king:
+                child = position_index(False, end, black_king, piece_square)
+            elif start == black_king:
+                child = position_index(True, white_king, end, piece_square)
+            else:
+                child = position_index(False, white_king, black_king, end)
+            parents.append(index)
+            children.append(child)
+
+    parents = np.frombuffer(parents, dtype=np.int32)
+    children = np.frombuffer(children, dtype=np.int32)
+    moving = np.flatnonzero(has_moves)
+    # Edges are grouped by parent, in index order
+    starts = np.searchsorted(parents, moving)
+
+    # Plies to mate, -1 while unsolved. The extra entry is `bare_kings`.
+    plies = np.full(POSITIONS + 1, -1, dtype=np.int16)
+    plies[:POSITIONS][mated] = 0
+    plies_left = 0
+    while True:
+        plies_left += 1
+        child_plies = plies[children]
+        unsolved = plies[moving] < 0
+        if plies_left % 2:
+            # A move to a position lost in `plies_left - 1`
+            found = np.logical_or.reduceat(child_plies == plies_left - 1, starts)
+        else:
+            # Every move to a won position
+            won = (child_plies >= 0) & (child_plies % 2 == 1)
+            found = np.logical_and.reduceat(won, starts)
+        solved = moving[unsolved & found]
+        if not len(solved):
+            if plies_left % 2 == 0:
+                break
+            continue
+        plies[solved] = plies_left
+
+    table = np.where(valid & (plies[:POSITIONS] >= 0), plies[:POSITIONS] + 1, 0)
+    return HEADER.pack(MAGIC, VERSION) + table.astype(np.uint8).tobytes()
+
+
+def write_table(name, directory) -> None:
+    """
+    Generates the table `name` into `directory`, replacing the file in one
+    step so running processes keep the table they mapped
+    """
+    path = os.path.join(directory, f"{name}.tb")
+    with open(f"{path}.partial", "wb") as file:
+        file.write(generate(name))
+    os.replace(f"{path}.partial", path)
+
+
+class Tablebase:
+    """
+    `directory: str`: Where `write_table()` put the tables
+
+    `probe(board)`: The `Probe` of a position, `None` when no table covers it
+
+    Tables are mapped the first time a position of theirs is probed.
+    """
+
+    def __init__(self, directory) -> None:
+        self.directory = directory
+        self.tables = {}
+
+    def table(self, name):
+        if name not in self.tables:
+            path = os.path.join(self.directory, f"{name}.tb")
+            data = None
+            if name in TABLES and os.path.exists(path):
+                with open(path, "rb") as file:
+                    data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                if data[: HEADER.size] != HEADER.pack(MAGIC, VERSION):
+                    raise ValueError(f"{path} is not a tablebase")
+            self.tables[name] = data
+        return self.tables[name]
+
+    def probe(self, board):
+        pieces = [(square, code) for square, code in enumerate(board.squares) if code]
+        if len(pieces) == 2:
+            return DRAWN
+        if len(pieces) != 3:
+            return None
+
+        ((piece_square, piece),) = (
+            (square, code) for square, code in pieces if code & PIECE_TYPE != KING_CODE
+        )
+        kings = {code: square for square, code in pieces}
+        white_king = kings[KING_CODE]
+        black_king = kings[KING_CODE | BLACK_PIECE]
+        white_to_play = board.white_to_play
+        # Black's piece: swap the colors and flip the board
+        if piece & BLACK_PIECE:
+            white_king, black_king = black_king ^ 56, white_king ^ 56
+            piece_square ^= 56
+            white_to_play = not white_to_play
+
+        name = "K" + "_PNBRQK"[piece & PIECE_TYPE] + "K"
+        data = self.table(name)
+        if data is None:
+            return None
+        index = position_index(white_to_play, white_king, black_king, piece_square)
+        value = data[HEADER.size + index]
+        if not value:
+            return DRAWN
+        plies = value - 1
+        return Probe(1 if plies % 2 else -1, plies)
+
+    def best_move(self, board):
+        """
+        The legal move with the best result, mating fastest or losing
+        slowest, `None` when no table covers `board` or it has no moves
+        """
+        if self.probe(board) is None:
+            return None
+        best = best_rank = None
+        for move in legal_moves(board):
+            record = board.play(move)
+            probe = self.probe(board)
+            board.undo(move, record)
+            # The move's result for the side playing it
+            if probe.wdl < 0:
+                rank = (1, -probe.plies)
+            elif probe.wdl > 0:
+                rank = (-1, probe.plies)
+            else:
+                rank = (0, 0)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = move, rank
+        return best
+
+
+_tablebase = None
+
+
+def get_tablebase():
+    """
+    The tables in `CHESS_TABLEBASE_DIR`, `None` when it isn't set
+    """
+    global _tablebase
+    if _tablebase is None:
+        directory = get_setting("CHESS_TABLEBASE_DIR", "")
+        if not directory:
+            return None
+        _tablebase = Tablebase(directory)
+    return _tablebase
+
+
+def tablebase_move(board):
+    """
+    The tablebase's best move for `board`, `None` when no table covers it
+    """
+    tablebase = get_tablebase()
+    if tablebase is None:
+        return None
+    return tablebase.best_move(board)
@@ -0,0 +1,371 @@
+import os
+import tempfile
+import time
+
+from django.test import SimpleTestCase
+
+from chess.bitboards import legal_moves
+from chess.book import DRAW, WHITE_WINS, OpeningBook, count_moves, write_book
+from chess.cache import LegalMoveCache
+from chess.constants import (
+    BLACK_WON,
+    CHECKMATE,
+    DRAWN,
+    FIFTY_MOVES,
+    GAME_OVER,
+    INSUFFICIENT_MATERIAL,
+    REPETITION,
+    ROOK_CODE,
+    SQUARES,
+    STALEMATE,
+)
+from chess.engine import ChessBoard, ChessEngine, Outcome
+from chess.evaluation import evaluate, evaluate_batch
+from chess.fen import load_fen
+from chess.moves import encode_move
+from chess.perft import POSITIONS, run_perft
+from chess.pgn import PgnError, parse_san, read_games, san
+from chess.search import MATE, Searcher
+from chess.tablebase import Tablebase, write_table
+from chess.transposition import EXACT, LOWER, UPPER, TranspositionTable
+from chess.zobrist import hash_board
+
+# Position -> deepest depth checked on every test run
+PERFT_DEPTHS = {
+    "start": 3,
+    "kiwipete": 3,
+    "position3": 4,
+    "position4": 3,
+    "position5": 3,
+    "position6": 2,
+}
+
+
+class PerftTestCase(SimpleTestCase):
+    """
+    Checks the move generator against the known perft node counts.
+    Deeper runs and timings are available through `manage.py perft`.
+    """
+
+    def test_known_node_counts(self):
+        for name, max_depth in PERFT_DEPTHS.items():
+            for depth in range(1, max_depth + 1):
+                with self.subTest(position=name, depth=depth):
+                    result = run_perft(name, depth)
+                    self.assertEqual(result["nodes"], POSITIONS[name][1][depth - 1])
+
+
+class ZobristTestCase(SimpleTestCase):
+    def test_incremental_key_matches_full_hash(self):
+        engine = ChessEngine()
+        for start, end in ([6, 4], [4, 4]), ([1, 3], [3, 3]), ([4, 4], [3, 3]):
+            engine.make_move(start, end)
+            self.assertEqual(engine.zobrist_key, hash_board(engine.board))
+
+    def test_transposition_has_same_key(self):
+        first, second = ChessEngine(), ChessEngine()
+        for start, end in ([7, 6], [5, 5]), ([0, 6], [2, 5]), ([6, 4], [5, 4]):
+            first.make_move(start, end)
+        for start, end in ([6, 4], [5, 4]), ([0, 6], [2, 5]), ([7, 6], [5, 5]):
+            second.make_move(start, end)
+        self.assertEqual(first.zobrist_key, second.zobrist_key)
+
+
+class PushPopTestCase(SimpleTestCase):
+    def test_pop_restores_the_position(self):
+        engine = ChessEngine()
+        before = engine.board.copy()
+        for _ in range(6):
+            engine.push(engine.legal_moves()[-1])
+        while engine.moves_history:
+            engine.pop()
+
+        self.assertEqual(engine.board.squares, before.squares)
+        self.assertEqual(engine.board.bitboards, before.bitboards)
+        self.assertEqual(engine.zobrist_key, before.key)
+        self.assertEqual(engine.captures, [])
+
+    def test_legal_moves_leave_the_board_alone(self):
+        # Other threads read the board while its moves are generated: a
+        # frozen board fails if legal_moves() changes it even for a moment
+        for fen in (POSITIONS["kiwipete"][0], "8/8/8/KPp4r/8/8/8/7k w - c6 0 1"):
+            with self.subTest(fen=fen):
+                board = load_fen(fen)
+                moves = legal_moves(board)
+                board.bitboards = tuple(board.bitboards)
+                self.assertEqual(legal_moves(board), moves)
+        # The en passant capture would expose the king along the rank
+        self.assertNotIn(encode_move(SQUARES["b5"], SQUARES["c6"]), legal_moves(board))
+
+
+class FenTestCase(SimpleTestCase):
+    def test_round_trip(self):
+        for name, (fen, _) in POSITIONS.items():
+            with self.subTest(position=name):
+                self.assertEqual(ChessEngine.from_fen(fen).to_fen(), fen)
+
+    def test_played_position(self):
+        engine = ChessEngine()
+        engine.make_move([6, 4], [4, 4])
+        fen = "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1"
+        self.assertEqual(engine.to_fen(), fen)
+        self.assertEqual(load_fen(fen).key, engine.zobrist_key)
+
+    def test_invalid(self):
+        for fen in (
+            "8/8/8 w - - 0 1",
+            "rnbqkbnr/pppppppp/9/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+            "rnbqkbnr/ppppxppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+            "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR x KQkq - 0 1",
+        ):
+            with self.subTest(fen=fen):
+                self.assertRaises(ValueError, load_fen, fen)
+
+
+PGN = """[Event "Test"]
+[Result "1-0"]
+
+1. e4 {best by test} e5 2. Qh5 (2. Nf3 Nc6) Nc6 3. Bc4 $1 Nf6?? 4. Qxf7# 1-0
+
+[Event "Second"]
+
+1. d4 d5 *
+"""
+
+
+class PgnTestCase(SimpleTestCase):
+    def test_read_and_write_san(self):
+        first, second = read_games(PGN.splitlines())
+        self.assertEqual(first.headers, {"Event": "Test", "Result": "1-0"})
+        self.assertEqual(list(second.sans()), ["d4", "d5"])
+
+        engine = ChessEngine()
+        written = []
+        for text in first.sans():
+            move = parse_san(engine.board, text)
+            written.append(san(engine.board, move))
+            engine.push(move)
+        self.assertEqual(written, ["e4", "e5", "Qh5", "Nc6", "Bc4", "Nf6", "Qxf7#"])
+
+    def test_comments(self):
+        text = """[Event "Comments"]
+
+1. e4 ; a line comment {
+e5 2. Nf3 {a comment spanning lines
+[with a bracket] ; and a semicolon
+} Nc6 *
+"""
+        (game,) = read_games(text.splitlines())
+        self.assertEqual(game.headers, {"Event": "Comments"})
+        self.assertEqual(list(game.sans()), ["e4", "e5", "Nf3", "Nc6"])
+
+    def test_disambiguation(self):
+        board = load_fen("4k3/8/8/8/8/8/4K3/R6R w - - 0 1")
+        move = parse_san(board, "Rad1")
+        self.assertEqual(san(board, move), "Rad1")
+        self.assertEqual(san(board, parse_san(board, "Ra8")), "Ra8+")
+        self.assertRaises(PgnError, parse_san, board, "Rd1")  # ambiguous
+        self.assertRaises(PgnError, parse_san, board, "Rb2")  # illegal
+
+    def test_special_moves(self):
+        engine = ChessEngine.from_fen("r3k2r/1P6/8/3pP3/8/8/8/R3K2R w KQkq d6 0 1")
+        written = []
+        sans = ["exd6", "O-O", "bxa8=N", "Kg7", "O-O-O"]
+        for text in sans:
+            move = parse_san(engine.board, text)
+            written.append(san(engine.board, move))
+            engine.push(move)
+        self.assertEqual(written, sans)
+        self.assertEqual(engine.to_fen(), "N4r2/6k1/3P4/8/8/8/8/2KR3R b - - 2 3")
+        self.assertEqual([str(piece) for piece in engine.captures], ["P", "R"])
+        while engine.moves_history:
+            engine.pop()
+        self.assertEqual(engine.board.key, hash_board(engine.board))
+        self.assertEqual(engine.to_fen(), "r3k2r/1P6/8/3pP3/8/8/8/R3K2R w KQkq d6 0 1")
+
+
+class MoveCacheTestCase(SimpleTestCase):
+    def test_lru_eviction(self):
+        cache = LegalMoveCache(maxsize=2)
+        engine = ChessEngine()
+        start = engine.board.copy()
+        engine.make_move([6, 4], [4, 4])
+        e4 = engine.board.copy()
+        engine.make_move([1, 4], [3, 4])
+        e5 = engine.board.copy()
+
+        self.assertEqual(list(cache.get(start)), legal_moves(start))
+        cache.get(e4)
+        cache.get(start)  # now the most recently used
+        cache.get(e5)  # evicts e4
+        self.assertEqual(list(cache.entries), [start.key, e5.key])
+        self.assertEqual(
+            cache.info(), {"hits": 1, "misses": 3, "size": 2, "maxsize": 2}
+        )
+
+        cache.get(e4)
+        self.assertEqual(list(cache.entries), [e5.key, e4.key])
+        self.assertEqual(cache.info()["misses"], 4)
+
+
+class EvaluationTestCase(SimpleTestCase):
+    def test_batch_matches_single(self):
+        boards = [load_fen(fen) for fen, _ in POSITIONS.values()]
+        engine = ChessEngine()
+        for _ in range(8):
+            engine.push(engine.legal_moves()[0])
+            boards.append(engine.board.copy())
+        self.assertEqual(
+            evaluate_batch(boards).tolist(), [evaluate(board) for board in boards]
+        )
+        self.assertEqual(len(evaluate_batch([])), 0)
+
+
+class TranspositionTestCase(SimpleTestCase):
+    def test_replacement_and_aging(self):
+        table = TranspositionTable(0)  # a single slot, every key collides
+        self.assertEqual(table.size, 1)
+        table.store(1, 100, 5, EXACT, -250)
+        self.assertEqual(table.probe(1), (100, 5, EXACT, -250))
+
+        # A shallower result of another position doesn't evict a deeper one
+        table.store(2, 200, 3, LOWER, 40)
+        self.assertIsNone(table.probe(2))
+        table.store(2, 200, 6, LOWER, 40)
+        self.assertEqual(table.probe(2), (200, 6, LOWER, 40))
+        self.assertIsNone(table.probe(1))
+
+        # The same position is always updated
+        table.store(2, 300, 1, UPPER, 0)
+        self.assertEqual(table.probe(2), (300, 1, UPPER, 0))
+
+        # Entries of an earlier search give way whatever their depth
+        table.store(2, 300, 9, EXACT, 0)
+        table.new_search()
+        table.store(1, 100, 1, EXACT, 10)
+        self.assertEqual(table.probe(1), (100, 1, EXACT, 10))
+
+
+class SearchTestCase(SimpleTestCase):
+    def search(self, fen, **options):
+        return Searcher(load_fen(fen), table=TranspositionTable(1), **options).search()
+
+    def test_mate_in_one(self):
+        # Found at depth 1: the quiescence search doesn't stand pat in check
+        result = self.search("6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1", max_depth=1)
+        self.assertEqual(result.move, encode_move(SQUARES["a1"], SQUARES["a8"]))
+        self.assertEqual(result.score, MATE - 1)
+
+    def test_mate_in_two(self):
+        result = self.search("7k/8/8/8/8/8/R7/1R4K1 w - - 0 1", max_depth=4)
+        self.assertEqual(result.score, MATE - 3)
+        self.assertIn(
+            result.move,
+            [
+                encode_move(SQUARES["a2"], SQUARES["a7"]),
+                encode_move(SQUARES["b1"], SQUARES["b7"]),
+            ],
+        )
+
+    def test_deadline(self):
+        started = time.perf_counter()
+        result = self.search(POSITIONS["kiwipete"][0], time_ms=50)
+        elapsed = (time.perf_counter() - started) * 1000
+        self.assertLess(elapsed, 150)
+        self.assertIn(result.move, legal_moves(load_fen(POSITIONS["kiwipete"][0])))
+
+
+class BookTestCase(SimpleTestCase):
+    def test_build_and_lookup(self):
+        board = ChessBoard()
+        e4, d4 = parse_san(board, "e4"), parse_san(board, "d4")
+        games = [([e4], WHITE_WINS), ([e4], DRAW), ([d4], DRAW), ([d4, e4], DRAW)]
+        counts = count_moves(games)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "book.bin")
+            self.assertEqual(write_book(counts, path, min_games=2), 2)
+            book = OpeningBook(path)
+            try:
+                moves = book.lookup(board.key)
+                self.assertEqual([entry.move for entry in moves], [d4, e4])
+                self.assertEqual(moves[1][1:], (1, 1, 0))
+                self.assertIn(book.choose(board.key), (e4, d4))
+                board.play(e4)
+                self.assertEqual(book.lookup(board.key), [])
+                self.assertIsNone(book.choose(board.key))
+            finally:
+                book.close()
+
+
+class TablebaseTestCase(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        write_table("KQK", cls.directory.name)
+        cls.tablebase = Tablebase(cls.directory.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def test_probe(self):
+        probe = self.tablebase.probe
+        board = load_fen("7k/8/6K1/8/8/8/8/1Q6 w - - 0 1")
+        self.assertEqual(probe(board), (1, 1))
+        self.assertEqual(san(board, self.tablebase.best_move(board)), "Qb8#")
+        # Black's queen, read from the mirrored board
+        self.assertEqual(probe(load_fen("1q6/8/8/8/8/6k1/8/7K b - - 0 1")), (1, 1))
+        self.assertEqual(probe(load_fen("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1")), (0, 0))
+        self.assertEqual(probe(load_fen("8/8/3k4/8/8/8/8/Q3K3 b - - 0 1")).wdl, -1)
+        self.assertIsNone(probe(load_fen("8/8/3k4/8/8/8/8/R3K3 b - - 0 1")))
+
+
+def play(engine, *moves):
+    for move in moves:
+        start, end = SQUARES[move[:2]], SQUARES[move[2:]]
+        engine.make_move([start // 8, start % 8], [end // 8, end % 8])
+
+
+class OutcomeTestCase(SimpleTestCase):
+    def test_checkmate(self):
+        engine = ChessEngine()
+        play(engine, "f2f3", "e7e5", "g2g4")
+        self.assertIsNone(engine.result)
+        play(engine, "d8h4")
+        self.assertTrue(engine.in_check())
+        self.assertEqual(engine.result, Outcome(BLACK_WON, CHECKMATE))
+        play(engine, "a2a3")
+        self.assertEqual(engine.messages[-1], GAME_OVER)
+        engine.pop()
+        self.assertIsNone(engine.result)
+
+    def test_promotion(self):
+        engine = ChessEngine.from_fen("7k/P7/8/8/8/8/8/K7 w - - 0 1")
+        self.assertIsNotNone(engine.make_move([1, 0], [0, 0], promotion=ROOK_CODE))
+        self.assertEqual(engine.to_fen(), "R6k/8/8/8/8/8/8/K7 b - - 0 1")
+        engine.pop()
+        self.assertIsNone(engine.result)
+
+    def test_draws(self):
+        engine = ChessEngine.from_fen("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1")
+        self.assertEqual(engine.result, Outcome(DRAWN, STALEMATE))
+
+        engine = ChessEngine.from_fen("7k/8/8/8/8/8/8/R3K3 w - - 99 80")
+        play(engine, "a1a2")
+        self.assertEqual(engine.result, Outcome(DRAWN, FIFTY_MOVES))
+
+        engine = ChessEngine.from_fen("7k/8/8/8/8/8/8/N3K3 w - - 0 1")
+        self.assertEqual(engine.outcome(), Outcome(DRAWN, INSUFFICIENT_MATERIAL))
+        engine = ChessEngine.from_fen("1b5k/8/8/8/8/8/8/4KB2 w - - 0 1")
+        self.assertIsNone(engine.outcome())  # bishops on both colors
+        engine = ChessEngine.from_fen("b6k/8/8/8/8/8/8/4KB2 w - - 0 1")
+        self.assertEqual(engine.outcome(), Outcome(DRAWN, INSUFFICIENT_MATERIAL))
+
+        engine = ChessEngine()
+        play(engine, "g1f3", "g8f6", "f3g1", "f6g8", "g1f3", "g8f6", "f3g1")
+        self.assertIsNone(engine.result)
+        play(engine, "f6g8")
+        self.assertEqual(engine.result, Outcome(DRAWN, REPETITION))
@@ -0,0 +1,97 @@
+"""
+  The transposition table of the search.
+
+  A fixed number of slots, preallocated as two `array("Q")`s so the table
+  costs 16 bytes per slot and no python objects. Each slot packs the best
+  move, depth, bound type, search generation and score of a position into
+  one 64 bit word, and stores the Zobrist key XOR that word so a slot written
+  halfway by another thread is simply seen as a miss.
+
+  A slot is replaced when the new result is at least as deep, or when the
+  stored one comes from an earlier search.
+"""
+from array import array
+
+from chess.services import get_setting
+
+EXACT = 0
+LOWER = 1  # the score is at least this, a beta cutoff
+UPPER = 2  # the score is at most this, no move raised alpha
+
+SLOT_BYTES = 16
+SCORE_OFFSET = 1 << 31
+
+
+class TranspositionTable:
+    """
+    `megabytes: int`: Memory budget, rounded down to a power of two slots
+
+    `probe(key)`: The `(move, depth, bound, score)` stored for a position,
+    or `None`
+
+    `store(key, move, depth, bound, score)`: Records a search result
+
+    `new_search()`: Marks older entries as replaceable
+    """
+
+    def __init__(self, megabytes) -> None:
+        slots = max(1, megabytes * 1024 * 1024 // SLOT_BYTES)
+        self.size = 1 << (slots.bit_length() - 1)
+        self.mask = self.size - 1
+        self.keys = array("Q", bytes(8 * self.size))
+        self.data = array("Q", bytes(8 * self.size))
+        self.generation = 0
+
+    def probe(self, key):
+        index = key & self.mask
+        data = self.data[index]
+        if data == 0 or self.keys[index] ^ data != key:
+            return None
+        return (
+            data & 0xFFFF,
+            data >> 16 & 0xFF,
+            data >> 24 & 0x3,
+            (data >> 32) - SCORE_OFFSET,
+        )
+
+    def store(self, key, move, depth, bound, score) -> None:
+        index = key & self.mask
+        stored = self.data[index]
+        if (
+            stored
+            and self.keys[index] ^ stored != key
+            and stored >> 26 & 0x3F == self.generation
+            and stored >> 16 & 0xFF > depth
+        ):
+            return
+
+        data = (
+            move
+            | depth << 16
+            | bound << 24
+            | self.generation << 26
+            | (score + SCORE_OFFSET) << 32
+        )
+        self.data[index] = data
+        self.keys[index] = key ^ data
+
+    def new_search(self) -> None:
+        self.generation = (self.generation + 1) & 0x3F
+
+    def clear(self) -> None:
+        self.keys = array("Q", bytes(8 * self.size))
+        self.data = array("Q", bytes(8 * self.size))
+        self.generation = 0
+
+
+_table = None
+
+
+def get_transposition_table() -> TranspositionTable:
+    """
+    The table shared by every search in the process, sized by `CHESS_TT_MB`
+    """
+    global _table
+    if _table is None:
+        _table = TranspositionTable(get_setting("CHESS_TT_MB", 16))
+    return _table
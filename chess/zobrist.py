@@ -0,0 +1,34 @@
+"""
+  Zobrist hashing.
+
+  Every (piece code, square) pair, the side to move, each castling rights
+  mask and each en passant file gets a random 64 bit key. The hash of a
+  position is the XOR of the keys present, so a move updates it by XORing out
+  what changed instead of rehashing the board.
+"""
+import random
+
+_random = random.Random(20220710)  # fixed seed, hashes are stable across runs
+
+PIECE_KEYS = [[_random.getrandbits(64) for _ in range(64)] for _ in range(16)]
+BLACK_TO_MOVE = _random.getrandbits(64)
+CASTLING_KEYS = [_random.getrandbits(64) for _ in range(16)]
+EN_PASSANT_KEYS = [_random.getrandbits(64) for _ in range(8)]
+
+# The empty square has no key
+PIECE_KEYS[0] = [0] * 64
+
+
+def hash_board(board) -> int:
+    """
+    Computes the key of a board from scratch
+    """
+    key = CASTLING_KEYS[board.castling]
+    for square, code in enumerate(board.squares):
+        if code:
+            key ^= PIECE_KEYS[code][square]
+    if not board.white_to_play:
+        key ^= BLACK_TO_MOVE
+    if board.en_passant >= 0:
+        key ^= EN_PASSANT_KEYS[board.en_passant % 8]
+    return key
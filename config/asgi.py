@@ -13,8 +13,10 @@ from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.security.websocket import AllowedHostsOriginValidator
 from django.core.asgi import get_asgi_application
+from django.urls import re_path
 
 from apps.game import routing
+from apps.game.lifespan import lifespan
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
@@ -22,9 +24,10 @@ app = get_asgi_application()
 
 application = ProtocolTypeRouter(
     {
-        "http": app,
+        "http": URLRouter(routing.http_urlpatterns + [re_path(r"", app)]),
         "websocket": AllowedHostsOriginValidator(
             AuthMiddlewareStack(URLRouter(routes=routing.websocket_urlpatterns))
         ),
+        "lifespan": lifespan,
     }
 )
@@ -151,3 +151,30 @@ USE_TZ = True
 # }
 
 CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+
+# Engine
+CHESS_MOVE_CACHE_SIZE = env.int("CHESS_MOVE_CACHE_SIZE", default=50000)
+CHESS_TT_MB = env.int("CHESS_TT_MB", default=16)  # transposition table, per process
+
+# Computer opponent
+CHESS_BOT_WORKERS = env.int("CHESS_BOT_WORKERS", default=2)
+CHESS_BOT_MOVETIME_MS = env.int("CHESS_BOT_MOVETIME_MS", default=1000)
+CHESS_BOT_TIMEOUT_MS = env.int("CHESS_BOT_TIMEOUT_MS", default=5000)
+CHESS_BOT_MAX_QUEUE = env.int("CHESS_BOT_MAX_QUEUE", default=64)
+CHESS_BOOK_PATH = env.str("CHESS_BOOK_PATH", default="")  # manage.py build_book
+CHESS_TABLEBASE_DIR = env.str("CHESS_TABLEBASE_DIR", default="")  # generate_tablebases
+
+# Live games
+CHESS_EVENT_BUFFER = env.int("CHESS_EVENT_BUFFER", default=256)  # moves kept to resume
+CHESS_GAME_LINGER_S = env.int("CHESS_GAME_LINGER_S", default=60)  # after last leave
+
+# Move persistence, see apps.game.persistence
+CHESS_PERSIST_FLUSH_MS = env.int("CHESS_PERSIST_FLUSH_MS", default=500)
+CHESS_PERSIST_BATCH = env.int("CHESS_PERSIST_BATCH", default=200)  # moves per flush
+CHESS_PERSIST_MAX_PENDING = env.int("CHESS_PERSIST_MAX_PENDING", default=5000)
+CHESS_PERSIST_RETRIES = env.int("CHESS_PERSIST_RETRIES", default=3)  # refusals, then dropped
+
+# Replays of stored games, see apps.game.replay
+CHESS_REPLAY_CHECKPOINT = env.int("CHESS_REPLAY_CHECKPOINT", default=16)  # plies
+CHESS_REPLAY_CACHE_GAMES = env.int("CHESS_REPLAY_CACHE_GAMES", default=256)